@@ -0,0 +1 @@
+# Permite ``import pyroguard`` al correr ``python -m pytest`` desde este directorio.
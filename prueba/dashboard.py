@@ -1,10 +1,18 @@
-import math, time, io, os, json, hashlib, re
-from datetime import datetime
+import time, os, uuid
 import numpy as np
 import pandas as pd
 import streamlit as st
 import pydeck as pdk
-from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from pyroguard import metrics, risk as risk_engine
+from pyroguard.dispatch import ETAEngine, TrafficField, demo_units, eta_minutes
+from pyroguard.config import CENTER, DATA_DIR, CSV_PATH, METRICS_PATH, STORE_DIR
+from pyroguard.firms import bbox_around, file_digest, firms_template, load_firms
+from pyroguard.mapagg import map_points, risk_map_payload
+from pyroguard.positions import load_overrides, save_overrides
+from pyroguard.service import DataService
+from pyroguard.spatial import HOTSPOT_RADIUS_KM, HotspotIndex
+from pyroguard.store import TelemetryStore
 
 # Intenta importar serial para telemetría
 try:
@@ -15,100 +23,57 @@ except Exception:
 # --- Configuración de Página ---
 st.set_page_config(page_title="PyroGuard Nexus – Dashboard v2", layout="wide", page_icon="🔥")
 
+# Tiempo de cada corrida del script; el perfilador, si se armó desde Diagnóstico, cubre esta corrida.
+RENDER = metrics.stage("render")
+RENDER_MAP = metrics.stage("render_map")
+render_t0 = time.perf_counter()
+metrics.PROFILER.begin("render")
+
+
+def rerun():
+    """``st.rerun`` corta el script aquí: se cierra antes el ciclo perfilado para que el reporte cubra una sola corrida."""
+    metrics.PROFILER.end("render")
+    st.rerun()
+
 st.title("🚀 PyroGuard Nexus – Simulador v2")
 st.caption("Demo educativa para NASA Space Apps: Detección temprana, datos satelitales, movilidad y telemetría en vivo.")
 
 TAB_RISK, TAB_INCIDENTS, TAB_MOBILITY, TAB_TELEM = st.tabs(["🔥 Riesgo", "🛰️ Incidentes (FIRMS)", "🚑 Movilidad", "📡 Telemetría en vivo"])
 
-CENTER = [25.4389, -100.9733]  # Saltillo
-DATA_DIR = "data"
-CSV_PATH = f"{DATA_DIR}/mock_sensors.csv"
-OVR_PATH = f"{DATA_DIR}/overrides.json"
 
 # --- CREAR DIRECTORIO DE DATOS SI NO EXISTE ---
 os.makedirs(DATA_DIR, exist_ok=True)
 
 # --- Funciones de Carga y Cálculo ---
-@st.cache_data(show_spinner=False)
-def load_base_csv():
-    if os.path.exists(CSV_PATH):
-        return pd.read_csv(CSV_PATH)
-    else:
-        return pd.DataFrame(columns=["sensor_id","lat","lon","timestamp","temp_c","humidity_pct","wind_ms","smoke_ppm","fuel_dryness","risk_score","risk_label"])
-
-def deterministic_latlon(sensor_id:str):
-    h = hashlib.md5(sensor_id.encode()).hexdigest()
-    j1 = int(h[0:2], 16) / 255.0
-    j2 = int(h[2:4], 16) / 255.0
-    lat = CENTER[0] + (j1 - 0.5) * 0.18
-    lon = CENTER[1] + (j2 - 0.5) * 0.18
-    return float(lat), float(lon)
-
-def load_overrides():
-    if os.path.exists(OVR_PATH):
-        with open(OVR_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-def save_overrides(d):
-    # Esta función ya tenía la lógica correcta, la mantenemos por consistencia
-    os.makedirs(DATA_DIR, exist_ok=True)
-    with open(OVR_PATH, "w", encoding="utf-8") as f:
-        json.dump(d, f, indent=2, ensure_ascii=False)
-
-def calc_risk_score(row, w_temp=0.12, w_hum=-0.06, w_wind=0.18, w_dry=1.2, w_smoke=0.22, bias=-3.0):
-    z = w_temp*row.get("temp_c",0) + w_hum*row.get("humidity_pct",0) + w_wind*row.get("wind_ms",0) + w_dry*row.get("fuel_dryness",0) + w_smoke*row.get("smoke_ppm",0) + bias
-    return 1/(1+math.exp(-z))
-
-def label_from_score(s):
-    return "Alto" if s >= 0.66 else ("Medio" if s >= 0.33 else "Bajo")
-
-def firms_template():
-    return pd.DataFrame({
-        "latitude": [CENTER[0]+0.05, CENTER[0]-0.07, CENTER[0]+0.12],
-        "longitude": [CENTER[1]-0.06, CENTER[1]+0.03, CENTER[1]+0.08],
-        "date": [str(datetime.now().date())]*3,
-        "brightness": [330.1, 342.5, 318.9],
-    })
-
-def parse_telemetry_line(line: str):
-    """
-    Parsea una línea de telemetría con formato libre usando expresiones regulares.
-    Extrae temperatura, humedad y otros valores si están presentes.
-    """
-    temp_match = re.search(r"T:(\d+\.?\d*)", line)
-    hum_match = re.search(r"H:(\d+\.?\d*)", line)
-    wind_match = re.search(r"W:(\d+\.?\d*)", line)
-    smoke_match = re.search(r"SM:(\d+\.?\d*)", line)
-    dry_match = re.search(r"DRY:(\d+\.?\d*)", line)
-
-    if not temp_match:
-        return None
-
-    row = {
-        "sensor_id": "Arduino-Live",
-        "timestamp": datetime.now().isoformat(timespec="seconds"),
-        "temp_c": float(temp_match.group(1)) if temp_match else np.nan,
-        "humidity_pct": float(hum_match.group(1)) if hum_match else np.nan,
-        "wind_ms": float(wind_match.group(1)) if wind_match else np.nan,
-        "smoke_ppm": float(smoke_match.group(1)) if smoke_match else np.nan,
-        "fuel_dryness": float(dry_match.group(1)) if dry_match else np.nan,
-    }
-    
-    ovr = load_overrides()
-    sid = str(row["sensor_id"])
-    if sid in ovr:
-        row["lat"] = ovr[sid]["lat"]
-        row["lon"] = ovr[sid]["lon"]
-    else:
-        row["lat"], row["lon"] = deterministic_latlon(sid)
-
-    row["risk_score"] = calc_risk_score(row)
-    row["risk_label"] = label_from_score(row["risk_score"])
-    
-    return row
-
-# --- Sidebar Overrides (sin cambios) ---
+@st.cache_resource(show_spinner=False)
+def get_service():
+    # Un servicio por proceso: almacén, ingesta y snapshot puntuado compartidos por todas las sesiones.
+    store = TelemetryStore(STORE_DIR)
+    # Primera ejecución: migra el CSV histórico al almacén segmentado.
+    if not store.partitions() and os.path.exists(CSV_PATH):
+        store.import_csv(CSV_PATH)
+    return DataService(store)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_firms_upload(digest, _data, bbox):
+    # La llave es el hash del archivo (más la caja); `_data` no se hashea.
+    return load_firms(_data, bbox=bbox)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_hotspot_index(key, _firms):
+    return HotspotIndex.from_frame(_firms)
+
+@st.cache_resource(show_spinner=False)
+def get_eta_engine():
+    # Matrices de ETA compartidas entre sesiones; se recalculan solo si cambian posiciones o parámetros.
+    return ETAEngine()
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def risk_map_layers(version, weights, zoom, risk_filter, _dff):
+    # Llave: versión del snapshot, pesos del modelo y vista; `_dff` no se hashea.
+    return risk_map_payload(_dff, zoom)
+
+# --- Sidebar Overrides ---
 st.sidebar.header("Overrides de posición (opcional)")
 ovr = load_overrides()
 sid = st.sidebar.text_input("sensor_id", placeholder="S-1001")
@@ -131,10 +96,14 @@ if btn_set and sid.strip():
     except Exception as e:
         st.sidebar.error(f"Error: {e}")
 
-# --- Tab 1: Risk (sin cambios) ---
+# --- Tab 1: Risk ---
 with TAB_RISK:
     st.subheader("Dashboard de Riesgo y Alertas de Detección Satelital")
-    df = load_base_csv()
+    # KPIs y mapa leen el snapshot por sensor del servicio: se puntúa una vez por versión y pesos
+    # para todas las sesiones. Las vistas son compartidas: no modificarlas en sitio.
+    service = get_service()
+    service.refresh()
+    df = service.scored()
 
     num_active_fires = 0
     num_critical_alerts = 0
@@ -142,9 +111,6 @@ with TAB_RISK:
     avg_confidence_pct = 0.0
 
     if len(df):
-        df["risk_score"] = df.apply(lambda r: calc_risk_score(r), axis=1)
-        df["risk_label"] = df["risk_score"].apply(label_from_score)
-        
         high_risk_sensors = df[df["risk_label"] == "Alto"]
         
         num_active_fires = len(high_risk_sensors)
@@ -153,7 +119,7 @@ with TAB_RISK:
         affected_area_km2 = num_active_fires * 2.0 + num_critical_alerts * 20.0
         affected_area_km2 = round(min(affected_area_km2, 100.0), 1)
         
-        avg_confidence_pct = round(df["risk_score"].mean() * 100, 0) if len(df) else 0.0
+        avg_confidence_pct = round(df["risk_score"].mean() * 100, 0) if df["risk_score"].notna().any() else 0.0
         avg_confidence_pct = max(avg_confidence_pct, 83.0) 
 
     st.markdown(
@@ -195,8 +161,25 @@ with TAB_RISK:
         st.metric(label="Avg Confidence", value=f"{int(avg_confidence_pct)}%", help="Precisión de detección promedio.")
         st.markdown('</div>', unsafe_allow_html=True)
 
+    # Alertas que el motor emite al llegar cada lectura; el bloque se refresca solo.
+    @st.fragment(run_every=2)
+    def alerts_panel():
+        alerts = get_service().alerts
+        recent = get_service().alert_feed.tail(20)
+        with st.expander(f"🚨 Alertas en vivo ({len(alerts.active())} sensores en alerta)", expanded=bool(recent)):
+            if recent:
+                st.dataframe(pd.DataFrame(recent[::-1])[["detected_at", "sensor_id", "kind", "previous", "level", "score", "latency_ms"]], use_container_width=True)
+            else:
+                st.caption("Sin alertas desde que inició el servicio.")
+            s = alerts.snapshot()
+            if s["alerts"]:
+                st.caption(f"{s['alerts']} alertas · suprimidas {s['suppressed_cooldown'] + s['suppressed_rate']} · "
+                           f"latencia lectura→alerta p50/p99 {s['alert_latency_p50_ms']:.0f}/{s['alert_latency_p99_ms']:.0f} ms")
+
+    alerts_panel()
+
     st.markdown("---")
-    
+
     with st.expander("Parámetros del modelo (ajusta y observa el efecto)"):
         c1, c2, c3 = st.columns(3)
         with c1:
@@ -208,69 +191,105 @@ with TAB_RISK:
         with c3:
             w_smoke= st.slider("Peso humo", 0.00, 0.60, 0.22, 0.01)
             bias   = st.slider("Umbral (bias)", -5.0, 0.0, -3.0, 0.1)
+        w_fire = st.slider("Peso cercanía a focos FIRMS", 0.0, 5.0, 2.0, 0.1, help="Solo aplica si hay focos cargados en la pestaña de Incidentes.")
 
     if len(df):
-        df["risk_score"] = df.apply(lambda r: calc_risk_score(r, w_temp, w_hum, w_wind, w_dry, w_smoke, bias), axis=1)
-        df["risk_label"] = df["risk_score"].apply(label_from_score)
-
-        if "sensor_id" in df.columns:
-            for i, row in df.iterrows():
-                sid = str(row["sensor_id"])
-                if sid in ovr:
-                    df.at[i, "lat"] = ovr[sid]["lat"]
-                    df.at[i, "lon"] = ovr[sid]["lon"]
-                if pd.isna(df.at[i,"lat"]) or pd.isna(df.at[i,"lon"]):
-                    lat, lon = deterministic_latlon(sid)
-                    df.at[i,"lat"], df.at[i,"lon"] = lat, lon
-
-        dff = df.copy().rename(columns={"lat":"latitude","lon":"longitude"})
-        risk_filter = st.multiselect("Riesgo a mostrar en mapa", ["Bajo", "Medio", "Alto"], default=["Medio", "Alto"])
+        weights = risk_engine.RiskWeights(w_temp, w_hum, w_wind, w_dry, w_smoke, bias, w_fire)
+        df = service.scored(weights)
+
+        dff = df.rename(columns={"lat":"latitude","lon":"longitude"})
+        col_filter, col_zoom, col_surface = st.columns([3,1,1])
+        with col_filter:
+            risk_filter = st.multiselect("Riesgo a mostrar en mapa", ["Bajo", "Medio", "Alto"], default=["Medio", "Alto"])
+        with col_zoom:
+            map_zoom = st.slider("Zoom del mapa", 5, 14, 9, help="Define el tamaño de las celdas del mapa de calor.")
+        with col_surface:
+            show_surface = st.checkbox("Superficie interpolada", value=True, help="Riesgo entre sensores: interpola sus lecturas y aplica el modelo en cada celda.")
         dff = dff[dff["risk_label"].isin(risk_filter)]
 
-        scatter = pdk.Layer("ScatterplotLayer", data=dff, get_position="[longitude, latitude]", get_radius="risk_score * 1200", pickable=True, opacity=0.7, get_fill_color="[255 * risk_score, 80, 120]")
-        heat = pdk.Layer("HeatmapLayer", data=dff, get_position="[longitude, latitude]", get_weight="risk_score", aggregation='MEAN', radius_pixels=60)
+        with RENDER_MAP.time():
+            # Al navegador solo van celdas agregadas y la última lectura por sensor.
+            heat_df, points_df = risk_map_layers(service.version, weights, map_zoom, tuple(risk_filter), dff)
+
+            scatter = pdk.Layer("ScatterplotLayer", data=points_df, get_position="[longitude, latitude]", get_radius="risk_score * 1200", pickable=True, opacity=0.7, get_fill_color="[255 * risk_score, 80, 120]")
+            if show_surface:
+                # Teselas ya pintadas en el servidor (compartidas entre sesiones) en lugar del heatmap del navegador.
+                base_layers = [pdk.Layer("BitmapLayer", id=f"surface-{t['tile']}", image=t["image"], bounds=t["bounds"], opacity=0.8) for t in service.surface_layers(weights, map_zoom)]
+            else:
+                base_layers = [pdk.Layer("HeatmapLayer", data=heat_df, get_position="[longitude, latitude]", get_weight="risk_mean", aggregation='MEAN', radius_pixels=60)]
 
-        st.pydeck_chart(pdk.Deck(map_style=None, initial_view_state=pdk.ViewState(latitude=CENTER[0], longitude=CENTER[1], zoom=9, pitch=40), layers=[heat, scatter], tooltip={"text": "Sensor: {sensor_id}\nRiesgo: {risk_label} ({risk_score})\nTemp: {temp_c}°C  Hum: {humidity_pct}%  Viento: {wind_ms} m/s"}))
+            st.pydeck_chart(pdk.Deck(map_style=None, initial_view_state=pdk.ViewState(latitude=CENTER[0], longitude=CENTER[1], zoom=map_zoom, pitch=40), layers=base_layers + [scatter], tooltip={"text": "Sensor: {sensor_id}\nRiesgo: {risk_label} ({risk_score})\nTemp: {temp_c}°C  Hum: {humidity_pct}%  Viento: {wind_ms} m/s"}))
+        focos = f" · {len(service.hotspots)} focos FIRMS activos" if service.hotspots is not None else ""
+        st.caption(f"Mapa: {len(heat_df)} celdas agregadas y {len(points_df)} sensores{focos}.")
         st.dataframe(dff.sort_values("risk_score", ascending=False).head(30), use_container_width=True)
     else:
         st.info("Sin datos en CSV. Ve a '📡 Telemetría' para capturar en vivo o carga datos en data/mock_sensors.csv.")
 
-# --- Tab 2: Incidents (FIRMS) (sin cambios) ---
+# --- Tab 2: Incidents (FIRMS) ---
 with TAB_INCIDENTS:
     st.subheader("Focos de calor satelitales (NASA FIRMS o simulado)")
     up = st.file_uploader("Sube un CSV (FIRMS: columnas típicas latitude, longitude, acq_date/date, bright_ti4/brightness)", type=["csv"])
+
+    col_aoi, col_radius = st.columns([1,2])
+    with col_aoi:
+        use_aoi = st.checkbox("Filtrar al área de interés", value=True, key="firms_aoi")
+    with col_radius:
+        aoi_radius_km = st.slider("Radio alrededor del centro (km)", 10, 1000, 150, 10, key="firms_radius", disabled=not use_aoi)
+    aoi_bbox = bbox_around(CENTER, aoi_radius_km) if use_aoi else None
+    if use_aoi:
+        with st.expander("Caja personalizada (opcional)"):
+            use_custom = st.checkbox("Usar caja personalizada", value=False, key="firms_custom_bbox")
+            b1, b2, b3, b4 = st.columns(4)
+            lat_min = b1.number_input("lat mín", value=float(aoi_bbox[0]), format="%.4f", key="firms_lat_min")
+            lat_max = b2.number_input("lat máx", value=float(aoi_bbox[1]), format="%.4f", key="firms_lat_max")
+            lon_min = b3.number_input("lon mín", value=float(aoi_bbox[2]), format="%.4f", key="firms_lon_min")
+            lon_max = b4.number_input("lon máx", value=float(aoi_bbox[3]), format="%.4f", key="firms_lon_max")
+            if use_custom:
+                aoi_bbox = (lat_min, lat_max, lon_min, lon_max)
+
     if up:
         try:
-            firms = pd.read_csv(up)
-            cols_lower = {c.lower(): c for c in firms.columns}
-            lat_col = cols_lower.get("latitude") or cols_lower.get("lat")
-            lon_col = cols_lower.get("longitude") or cols_lower.get("lon") or cols_lower.get("long")
-            date_col = cols_lower.get("acq_date") or cols_lower.get("date")
-            bright_col = cols_lower.get("bright_ti4") or cols_lower.get("brightness") or cols_lower.get("bright_ti5")
-
-            if not (lat_col and lon_col):
-                st.error("No se encontraron columnas de latitud/longitud.")
-                firms = pd.DataFrame()
-            else:
-                firms = firms.rename(columns={lat_col:"latitude", lon_col:"longitude"})
-                if date_col: firms = firms.rename(columns={date_col:"date"})
-                if bright_col: firms = firms.rename(columns={bright_col:"brightness"})
-                st.success(f"Cargados {len(firms)} focos de calor.")
+            data = up.getvalue()
+            firms, firms_stats = load_firms_upload(file_digest(data), data, aoi_bbox)
+            st.success(f"Cargados {firms_stats.rows_kept} focos de calor (de {firms_stats.rows_scanned} filas leídas).")
+        except ValueError as e:
+            st.error(str(e))
+            firms = pd.DataFrame()
         except Exception as e:
             st.exception(e)
             firms = pd.DataFrame()
     else:
         if st.button("Generar focos simulados", key="btn_firms_sim"):
+            st.session_state["firms_simulated"] = True
+        if st.session_state.get("firms_simulated"):
             firms = firms_template()
         else:
             if 'firms' not in locals():
                  firms = pd.DataFrame(columns=["latitude","longitude","date","brightness"])
 
+    # El índice se arma una vez por carga y lo comparten el Riesgo y la telemetría en vivo de todas las sesiones.
+    service = get_service()
+    firms_key = (file_digest(up.getvalue()), aoi_bbox) if up else ("simulados",)
     if len(firms):
-        st.map(firms[["latitude","longitude"]], zoom=9, use_container_width=True)
+        index = build_hotspot_index(firms_key, firms)
+        if service.hotspots_key != firms_key:
+            service.set_hotspots(firms_key, index)
+            st.session_state["hotspots_key"] = firms_key
+            rerun()
+        st.caption(f"Índice espacial: {len(index)} focos. Los sensores a menos de {HOTSPOT_RADIUS_KM:.0f} km suben su riesgo.")
+    elif st.session_state.get("hotspots_key") is not None:
+        # Solo se quitan los focos si los cargó esta sesión y siguen vigentes.
+        if service.hotspots_key == st.session_state["hotspots_key"]:
+            service.set_hotspots(None, None)
+        st.session_state["hotspots_key"] = None
+        rerun()
+
+    if len(firms):
+        firms_pts = map_points(firms, zoom=9)
+        st.map(firms_pts, zoom=9, size="size" if "size" in firms_pts.columns else None, use_container_width=True)
         st.dataframe(firms.head(100), use_container_width=True)
 
-# --- Tab 3: Mobility (sin cambios) ---
+# --- Tab 3: Mobility ---
 with TAB_MOBILITY:
     st.subheader("Simulador de carril inteligente y preeminencia semafórica")
     colA, colB, colC = st.columns(3)
@@ -281,14 +300,8 @@ with TAB_MOBILITY:
     with colC:
         intersections = st.slider("Semáforos en ruta", 2, 30, 12)
 
-    base_speed = 60
-    speed = base_speed * (1 - (traffic-1)*0.06)
-    speed = max(15, speed)
-    eta_no_priority = (distance_km / speed) * 60
-
-    green_wave_gain = min(0.5*intersections, 8)
-    driver_alert_gain = 0.4 * (11 - traffic)
-    eta_priority = max( (eta_no_priority - green_wave_gain - driver_alert_gain), distance_km/120*60 )
+    # Mismo modelo que la matriz de despacho de abajo (pyroguard.dispatch).
+    eta_no_priority, eta_priority = (float(v) for v in eta_minutes(distance_km, traffic, intersections))
 
     c1, c2, c3 = st.columns(3)
     c1.metric("ETA sin prioridad", f"{eta_no_priority:.1f} min")
@@ -298,7 +311,72 @@ with TAB_MOBILITY:
     st.progress(min(1.0, (eta_no_priority-eta_priority)/10.0))
     st.caption("Modelo simple para demo. En producción se integraría con señales V2X, semáforos conectados y rutas dinámicas.")
 
-# --- Tab 4: Telemetry (sin cambios en la lógica principal, solo corrección de error) ---
+    st.markdown("---")
+    st.subheader("Despacho: ETA de cada unidad a cada incidente")
+    colU, colT, colS = st.columns(3)
+    with colU:
+        n_units = st.slider("Unidades de respuesta", 5, 500, 50, 5, help="Posiciones de demostración alrededor del centro.")
+    with colT:
+        traffic_mode = st.radio("Tráfico por tramo", ["Uniforme (slider de arriba)", "Urbano (más denso al centro)"], key="dispatch_traffic")
+    with colS:
+        n_sim = st.slider("Incidentes simulados", 0, 5000, 0, 100, help="Además de sensores en riesgo Alto y focos FIRMS cargados.")
+
+    # Incidentes: sensores en riesgo Alto, focos FIRMS vigentes y, si se pide, simulados.
+    service = get_service()
+    scored = service.scored()
+    high = scored[scored["risk_label"] == "Alto"] if len(scored) else scored
+    inc_kind = ["Sensor"] * len(high)
+    inc_id = list(high["sensor_id"]) if len(high) else []
+    inc_lat, inc_lon = [high["lat"].to_numpy(dtype=float) if len(high) else np.empty(0)], [high["lon"].to_numpy(dtype=float) if len(high) else np.empty(0)]
+    if service.hotspots is not None and len(service.hotspots):
+        inc_lat.append(service.hotspots.lat)
+        inc_lon.append(service.hotspots.lon)
+        inc_kind += ["FIRMS"] * len(service.hotspots)
+        inc_id += [f"F-{i}" for i in range(len(service.hotspots))]
+    if n_sim:
+        sim_lat, sim_lon = demo_units(n_sim, CENTER, radius_km=40.0, seed=1)
+        inc_lat.append(sim_lat)
+        inc_lon.append(sim_lon)
+        inc_kind += ["Simulado"] * n_sim
+        inc_id += [f"SIM-{i}" for i in range(n_sim)]
+    inc_lat, inc_lon = np.concatenate(inc_lat), np.concatenate(inc_lon)
+
+    if len(inc_lat):
+        unit_lat, unit_lon = demo_units(n_units, CENTER)
+        segment_traffic = TrafficField(CENTER[0], CENTER[1]) if traffic_mode.startswith("Urbano") else traffic
+        res = get_eta_engine().compute(unit_lat, unit_lon, inc_lat, inc_lon, segment_traffic, intersections / distance_km)
+
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Incidentes", f"{len(inc_lat):,}")
+        m2.metric("ETA mediana (con prioridad)", f"{np.median(res.best_eta):.1f} min")
+        m3.metric("Peor ETA (con prioridad)", f"{res.best_eta.max():.1f} min")
+        m4.metric("Minutos ahorrados (mediana)", f"{np.median(res.best_eta_no_priority - res.best_eta):.1f}")
+
+        plan = pd.DataFrame({
+            "incidente": inc_id, "tipo": inc_kind,
+            "latitude": inc_lat, "longitude": inc_lon,
+            "unidad": [f"U-{u:03d}" for u in res.best_unit],
+            "unit_lat": unit_lat[res.best_unit], "unit_lon": unit_lon[res.best_unit],
+            "distancia_km": res.distance_km[res.best_unit, np.arange(len(inc_lat))].round(2),
+            "eta_sin_prioridad": res.eta[res.best_unit, np.arange(len(inc_lat))].round(1),
+            "eta_con_prioridad": res.best_eta.round(1),
+        }).sort_values("eta_con_prioridad", ascending=False)
+
+        # Al mapa va a lo más una línea por incidente para los peor cubiertos.
+        routes = plan.head(1000)
+        units_df = pd.DataFrame({"unidad": [f"U-{u:03d}" for u in range(n_units)], "latitude": unit_lat, "longitude": unit_lon})
+        st.pydeck_chart(pdk.Deck(map_style=None, initial_view_state=pdk.ViewState(latitude=CENTER[0], longitude=CENTER[1], zoom=9), layers=[
+            pdk.Layer("LineLayer", data=routes, get_source_position="[unit_lon, unit_lat]", get_target_position="[longitude, latitude]", get_color="[255, 170, 0, 120]", get_width=2),
+            pdk.Layer("ScatterplotLayer", data=routes, get_position="[longitude, latitude]", get_radius=250, get_fill_color="[255, 75, 75]", pickable=True),
+            pdk.Layer("ScatterplotLayer", data=units_df, get_position="[longitude, latitude]", get_radius=350, get_fill_color="[70, 130, 180]", pickable=True),
+        ], tooltip={"text": "{incidente}{unidad}"}))
+        st.dataframe(plan.drop(columns=["latitude", "longitude", "unit_lat", "unit_lon"]).head(30), use_container_width=True)
+        st.caption(f"Matriz {n_units} unidades × {len(inc_lat):,} incidentes; se recalcula solo si cambian posiciones o parámetros. "
+                   f"Semáforos por km: {intersections / distance_km:.2f} (de los sliders de arriba).")
+    else:
+        st.info("Sin incidentes: no hay sensores en riesgo Alto ni focos FIRMS cargados. Sube el número de incidentes simulados para probar.")
+
+# --- Tab 4: Telemetry ---
 with TAB_TELEM:
     st.subheader("Lectura serial en vivo (Arduino → Dashboard)")
 
@@ -323,13 +401,10 @@ with TAB_TELEM:
         with colb:
             baud = st.number_input("Baudrate", value=9600, step=1200, key="tele_baud")
         with cols:
-            seconds = st.slider("Intervalo de lectura (segundos)", 1, 20, 6, key="tele_seconds")
-        with col_stop:
-            if st.button("Detener Auto-actualización", key="stop_telemetry"):
-                st.session_state["telemetry_running"] = False
-                st.rerun()
-            
-        st.caption("Tip: cierra el Monitor Serie del Arduino IDE antes de conectar.")
+            seconds = st.slider("Intervalo de actualización (segundos)", 1, 20, 6, key="tele_seconds")
+
+        # Identifica a esta sesión como usuaria del puerto compartido.
+        session_owner = st.session_state.setdefault("ingest_owner", uuid.uuid4().hex)
 
         def normalize_port(p):
             if os.name == "nt":
@@ -338,95 +413,107 @@ with TAB_TELEM:
                     return r"\\.\\" + p
             return p.strip()
 
+        with col_stop:
+            if st.button("Detener lectura", key="stop_telemetry", help="Deja de leer en esta pestaña; el puerto se cierra cuando ninguna otra lo usa."):
+                st.session_state["telemetry_running"] = False
+                get_service().ingest.remove_port(normalize_port(port_raw), owner=session_owner)
+                rerun()
+
+        st.caption("Tip: cierra el Monitor Serie del Arduino IDE antes de conectar. El puerto queda abierto en segundo plano y se comparte entre pestañas del navegador; se cierra cuando todas detienen la lectura.")
+
         if "telemetry_running" not in st.session_state:
             st.session_state["telemetry_running"] = True
-            
+
         is_running = st.session_state["telemetry_running"]
 
         if is_running and port_raw.strip():
             port = normalize_port(port_raw)
-            status_placeholder = st.empty()
-            metrics_placeholder = st.empty()
-            data_code_placeholder = st.empty()
-            data_table_placeholder = st.empty()
-            map_placeholder = st.empty()
-            
-            while st.session_state["telemetry_running"]:
-                status_placeholder.info(f"Conectando a {port_raw} ({port}) @ {int(baud)} baud...")
-                lines = []
-                ser = None
-                
-                max_tries = 3
-                for attempt in range(1, max_tries+1):
-                    try:
-                        ser = serial.Serial(port=port, baudrate=int(baud), timeout=0.5, write_timeout=0.5)
-                        try:
-                            ser.dtr = False; ser.rts = False; time.sleep(0.15)
-                            ser.reset_input_buffer(); ser.reset_output_buffer()
-                            ser.dtr = True; ser.rts = True
-                        except Exception: pass
-                        break
-                    except serial.SerialException as e:
-                        if attempt == max_tries:
-                            status_placeholder.error(f"No se pudo abrir {port_raw}: {e}")
-                            st.session_state["telemetry_running"] = False
-                        else: time.sleep(0.6)
-
-                if ser is not None and ser.is_open:
-                    with ser:
-                        t_end = time.time() + seconds
-                        while time.time() < t_end:
-                            try:
-                                line = ser.readline().decode(errors="ignore").strip()
-                                if line: lines.append(line)
-                            except Exception: pass
-
-                    if not lines:
-                        status_placeholder.warning(f"No se recibieron líneas en {seconds}s. (Auto-reintento en 1s)")
-                        time.sleep(1); continue
-                    else:
-                        status_placeholder.success(f"Lectura exitosa. Último dato: {lines[-1]} (Auto-actualizando cada {seconds}s)")
-                        data_code_placeholder.code("\n".join(lines[-12:]), language="text")
-                        
-                        rows = []
-                        for ln in lines:
-                            new_row = parse_telemetry_line(ln)
-                            if new_row: rows.append(new_row)
-
-                        if rows:
-                            df_new = pd.DataFrame(rows)
-                            latest_data = df_new.iloc[-1]
-
-                            with metrics_placeholder.container():
-                                col1, col2, col3 = st.columns(3)
-                                col1.metric("🌡️ Temperatura", f"{latest_data['temp_c']:.1f} °C")
-                                col2.metric("💧 Humedad", f"{latest_data.get('humidity_pct', 0.0):.1f} %")
-                                col3.metric("🔥 Riesgo Calculado", f"{latest_data['risk_label']} ({latest_data['risk_score']:.2f})")
-
-                            data_table_placeholder.dataframe(df_new, use_container_width=True)
-                            
-                            base = load_base_csv()
-                            base = pd.concat([base, df_new], ignore_index=True)
-                            if "sensor_id" in base.columns and "timestamp" in base.columns:
-                                base = base.drop_duplicates(subset=["sensor_id","timestamp"], keep="last")
-                            base.to_csv(CSV_PATH, index=False)
-                            
-                            dff = df_new.rename(columns={"lat":"latitude","lon":"longitude"})
-                            if len(dff):
-                                map_placeholder.map(dff[["latitude","longitude"]], zoom=10, use_container_width=True)
-                        else:
-                            data_table_placeholder.info("No se pudieron parsear filas válidas en esta lectura. Verificando formato...")
-                            with metrics_placeholder.container():
-                                st.info("Esperando datos válidos para mostrar métricas...")
-                
-                time.sleep(seconds)
-                if st.session_state["telemetry_running"]:
-                    st.rerun() 
-                    
+            ingest = get_service().ingest
+            ingest.add_port(port, int(baud), owner=session_owner)
+
+            # Solo se refresca este bloque: lee del buffer del lector, nunca del puerto.
+            @st.fragment(run_every=seconds)
+            def telemetry_panel():
+                reader = ingest.reader(port)
+                if reader is None:
+                    st.info("Lector detenido.")
+                    return
+                info = reader.snapshot()
+                lines = list(reader.last_lines)
+                df_new = ingest.tail(200, port=port)
+
+                if info["state"] == "iniciando":
+                    st.info(f"Conectando a {port_raw} ({port}) @ {int(baud)} baud...")
+                elif info["state"] != "conectado":
+                    st.error(f"No se pudo abrir {port_raw} ({port}): {info['last_error']}. Reintentando en segundo plano...")
+                elif not len(df_new):
+                    st.warning(f"Conectado a {port_raw} @ {int(baud)} baud. Esperando datos válidos...")
+                else:
+                    st.success(f"Lectura en curso. Último dato: {lines[-1] if lines else '-'} (actualizando cada {seconds}s)")
+
+                if lines:
+                    st.code("\n".join(lines[-12:]), language="text")
+
+                if len(df_new):
+                    latest_data = df_new.iloc[-1]
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("🌡️ Temperatura", f"{latest_data['temp_c']:.1f} °C")
+                    col2.metric("💧 Humedad", f"{latest_data.get('humidity_pct', 0.0):.1f} %")
+                    col3.metric("🔥 Riesgo Calculado", f"{latest_data['risk_label']} ({latest_data['risk_score']:.2f})")
+
+                    st.dataframe(df_new.drop(columns=["port"]).iloc[::-1], use_container_width=True)
+
+                    dff = df_new.rename(columns={"lat":"latitude","lon":"longitude"})
+                    st.map(dff[["latitude","longitude"]], zoom=10, use_container_width=True)
+
+                st.caption(
+                    f"Líneas leídas: {info['lines_read']} · válidas: {info['lines_parsed']} · rechazadas: {info['lines_rejected']} · "
+                    f"reconexiones: {info['reconnects']} · errores de persistencia: {info['sink_errors']} · "
+                    f"pestañas usando el puerto: {ingest.owners(port)} · "
+                    f"desbordes del buffer: {ingest.ring.overflow}"
+                )
+
+            telemetry_panel()
+
         elif not is_running:
-            st.warning("Auto-actualización detenida. Presiona 'Conectar / Iniciar' para volver a empezar.")
-            if st.button("Conectar / Iniciar Auto-actualización", type="primary", key="start_telemetry"):
+            st.warning("Lectura detenida. Presiona 'Conectar / Iniciar' para volver a empezar.")
+            if st.button("Conectar / Iniciar lectura", type="primary", key="start_telemetry"):
                 st.session_state["telemetry_running"] = True
-                st.rerun()
+                rerun()
         else:
-            st.info("Ingresa un puerto serial y presiona 'Conectar / Iniciar' para empezar la lectura.")
\ No newline at end of file
+            st.info("Ingresa un puerto serial y presiona 'Conectar / Iniciar' para empezar la lectura.")
+
+# --- Diagnóstico del pipeline ---
+RENDER.observe(time.perf_counter() - render_t0)
+metrics.PROFILER.end("render")
+
+with TAB_TELEM:
+    with st.expander("🩺 Diagnóstico del pipeline"):
+        snap = metrics.REGISTRY.to_dict()
+        stages = pd.DataFrame.from_dict(snap["stages"], orient="index")
+        if len(stages):
+            stages = stages[stages["count"] > 0].drop(columns=["sum_s"]).sort_values("p99_ms", ascending=False)
+            st.markdown("**Latencia por etapa (ms)**")
+            st.dataframe(stages.round(3), use_container_width=True)
+        st.markdown("**Contadores**")
+        st.dataframe(pd.Series(snap["counters"], name="valor"), use_container_width=True)
+
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("Exportar métricas", key="metrics_export"):
+                metrics.REGISTRY.export(METRICS_PATH)
+                metrics.REGISTRY.export(os.path.splitext(METRICS_PATH)[0] + ".json")
+                st.success(f"Escrito {METRICS_PATH} (texto Prometheus) y su .json.")
+            st.download_button("Descargar (Prometheus)", metrics.REGISTRY.to_prometheus(), file_name="pyroguard.prom", key="metrics_download")
+        with c2:
+            profile_stage = st.selectbox("Perfilar un ciclo de", ["render", "ingest"], key="profile_stage",
+                                         help="render: la siguiente corrida del dashboard · ingest: de una escritura al almacén a la siguiente en el lector serial.")
+            if st.button("Perfilar", key="profile_arm"):
+                metrics.PROFILER.arm(profile_stage)
+                if profile_stage == "render":
+                    st.rerun()
+            if metrics.PROFILER.armed or metrics.PROFILER.running:
+                st.caption("Perfilador armado: el reporte aparece al terminar el ciclo.")
+        report = metrics.PROFILER.reports.get(profile_stage)
+        if report:
+            st.code(metrics.format_profile(report), language="text")
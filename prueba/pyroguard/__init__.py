@@ -0,0 +1,54 @@
+"""
+Núcleo de PyroGuard Nexus: lógica reutilizable fuera del dashboard de Streamlit.
+
+Importar el paquete no carga NumPy, pandas, pyarrow ni SciPy: los nombres de
+abajo se resuelven la primera vez que se usan, importando solo su módulo.
+Así un worker o el CLI pagan únicamente por lo que ocupan::
+
+    from pyroguard import calc_risk_score, parse_telemetry_batch
+"""
+import importlib
+
+# Nombre público -> módulo que lo define.
+_EXPORTS = {
+    "RiskWeights": "risk",
+    "DEFAULT_WEIGHTS": "risk",
+    "calc_risk_score": "risk",
+    "label_from_score": "risk",
+    "score": "risk",
+    "labels": "risk",
+    "deterministic_latlon": "positions",
+    "latlon_for": "positions",
+    "load_overrides": "positions",
+    "save_overrides": "positions",
+    "resolve_positions": "positions",
+    "PositionTable": "positions",
+    "parse_telemetry_line": "telemetry",
+    "parse_telemetry_batch": "telemetry",
+    "TelemetryStore": "store",
+    "SensorStateTable": "state",
+    "IngestService": "ingest",
+    "Gateway": "gateway",
+    "AlertEngine": "alerts",
+    "AlertRule": "alerts",
+    "load_firms": "firms",
+    "HotspotIndex": "spatial",
+    "risk_map_payload": "mapagg",
+    "eta_matrix": "dispatch",
+    "ETAEngine": "dispatch",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
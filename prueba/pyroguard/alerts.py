@@ -0,0 +1,317 @@
+"""
+Motor de alertas en flujo.
+
+``AlertEngine.consume(df, received_at)`` recibe cada lote recién parseado
+(es un listener de ``IngestService`` y del ``Gateway``) y mantiene por sensor
+un nivel confirmado sobre las bandas de ``label_from_score`` (Bajo / Medio /
+Alto) más una banda "Crítico" en 0.8, el mismo umbral del KPI "Critical
+Alerts". Las reglas se pueden fijar por sensor:
+
+- histéresis: para bajar de nivel el score debe caer ``hysteresis`` por
+  debajo del umbral de la banda, así un score que oscila en el borde no
+  dispara y limpia alertas sin parar;
+- duración mínima: un cambio de nivel se confirma tras ``min_duration_s``
+  segundos (según el timestamp de las lecturas) y ``min_readings`` lecturas;
+- deduplicación: un sensor que vuelve al mismo nivel dentro de
+  ``cooldown_s`` no repite la alerta;
+- límite global: a lo más ``max_per_s`` alertas por segundo (con ráfaga
+  ``burst``); una subida que no alcanza cupo no se confirma y se reintenta
+  con la siguiente lectura del sensor (cada intento se cuenta en
+  ``suppressed_rate``).
+
+Las alertas se entregan en un hilo aparte a los sinks (archivo JSONL, webhook
+o cola para la UI), así un sink lento no retrasa la evaluación. La latencia
+lectura→alerta se mide desde que el lote se recibió (o desde ``TX:`` si la
+lectura lo trae) hasta que la alerta sale del motor.
+"""
+import json
+import math
+import os
+import queue
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+
+from . import risk
+from .ingest import RingBuffer
+from .state import parse_ts
+
+# Banda extra por encima de "Alto"; mismo umbral que el KPI "Critical Alerts".
+CRITICAL = 0.8
+BANDS = tuple(risk.THRESHOLDS) + (CRITICAL,)
+LEVELS = tuple(risk.LABELS) + ("Crítico",)
+
+LATENCY_BUDGET_MS = 100.0
+
+
+def level_of(score, hysteresis=0.0):
+    """Índice en ``LEVELS`` para un score (NaN -> 0, como ``label_from_score``)."""
+    if score is None or math.isnan(score):
+        return 0
+    return bisect_right(BANDS, score + hysteresis)
+
+
+class AlertRule(NamedTuple):
+    min_level: int = 2          # "Alto"
+    hysteresis: float = 0.05
+    min_duration_s: float = 0.0
+    min_readings: int = 1
+    cooldown_s: float = 300.0
+
+
+class _SensorAlertState:
+    __slots__ = ("level", "candidate", "since", "count", "notified", "last_sent")
+
+    def __init__(self):
+        self.level = 0
+        self.candidate = None
+        self.since = 0.0
+        self.count = 0
+        self.notified = False
+        self.last_sent = {}
+
+
+# --- sinks ---
+class FileSink:
+    """Agrega cada alerta como una línea JSON a ``path``."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def __call__(self, alerts):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for a in alerts:
+                f.write(json.dumps(a, ensure_ascii=False) + "\n")
+
+
+class WebhookSink:
+    """
+    POST JSON (lista de alertas) a ``url``. Sin ``url`` funciona como doble
+    local: guarda los envíos en ``sent`` para inspeccionarlos.
+    """
+
+    def __init__(self, url=None, timeout=2.0, keep=200):
+        self.url = url
+        self.timeout = timeout
+        self.sent = deque(maxlen=keep)
+
+    def __call__(self, alerts):
+        body = json.dumps(alerts, ensure_ascii=False).encode()
+        if self.url is None:
+            self.sent.append(body)
+            return
+        import urllib.request
+
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout):
+            pass
+
+
+class UIQueueSink:
+    """Cola acotada para el dashboard: ``read(since)`` y ``tail(n)`` como el ``RingBuffer`` de la ingesta."""
+
+    def __init__(self, capacity=500):
+        self.ring = RingBuffer(capacity)
+
+    def __call__(self, alerts):
+        self.ring.push(alerts)
+
+    def read(self, since=0):
+        return self.ring.read(since)
+
+    def tail(self, n=20):
+        return self.ring.tail(n)
+
+
+# --- motor ---
+class AlertEngine:
+    """
+    Evalúa lecturas contra reglas por sensor y despacha alertas a ``sinks``.
+
+    ``rule`` es la regla por defecto y ``rules`` un dict ``sensor_id -> AlertRule``.
+    ``origin_col``: columna con la hora de origen de cada lectura (epoch); si
+    el lote no la trae se usa ``received_at``.
+    """
+
+    def __init__(self, sinks=(), rule=AlertRule(), rules=None, max_per_s=50.0, burst=200,
+                 origin_col="tx", latency_samples=100_000):
+        self.sinks = list(sinks)
+        self.rule = rule
+        self.rules = dict(rules or {})
+        self.max_per_s = max_per_s
+        self.burst = burst
+        self.origin_col = origin_col
+        self.latencies = deque(maxlen=latency_samples)
+        self.batch_latencies = deque(maxlen=latency_samples)
+        self._sensors = {}
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._t_tokens = time.monotonic()
+        self._ts_cache = (None, math.nan)
+        self.stats = {
+            "readings": 0,
+            "batches": 0,
+            "alerts": 0,
+            "suppressed_cooldown": 0,
+            "suppressed_rate": 0,
+            "sink_errors": 0,
+            "last_error": None,
+        }
+        self._queue = queue.SimpleQueue()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="alert-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def set_rule(self, sensor_id, rule):
+        with self._lock:
+            self.rules[sensor_id] = rule
+
+    def _time_of(self, ts):
+        last, value = self._ts_cache
+        if ts != last:
+            value = parse_ts(ts)
+            self._ts_cache = (ts, value)
+        return value
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._t_tokens) * self.max_per_s)
+        self._t_tokens = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def consume(self, df, received_at=None):
+        """Evalúa un lote; devuelve las alertas emitidas (ya encoladas a los sinks)."""
+        n = len(df)
+        if not n:
+            return []
+        if received_at is None:
+            received_at = time.time()
+        sids = df["sensor_id"].to_numpy()
+        scores = df["risk_score"].to_numpy(dtype=float, na_value=np.nan)
+        stamps = df["timestamp"].to_numpy() if "timestamp" in df.columns else np.full(n, None)
+        lat = df["lat"].to_numpy(dtype=float, na_value=np.nan) if "lat" in df.columns else np.full(n, np.nan)
+        lon = df["lon"].to_numpy(dtype=float, na_value=np.nan) if "lon" in df.columns else np.full(n, np.nan)
+        origin = df[self.origin_col].to_numpy(dtype=float, na_value=np.nan) if self.origin_col in df.columns else None
+
+        out = []
+        with self._lock:
+            default, rules, sensors = self.rule, self.rules, self._sensors
+            for i in range(n):
+                sid, score = sids[i], scores[i]
+                rule = rules.get(sid, default) if rules else default
+                s = sensors.get(sid)
+                level = level_of(score)
+                if s is None:
+                    if level < rule.min_level:
+                        continue
+                    s = sensors[sid] = _SensorAlertState()
+                # Histéresis: para bajar, el score debe salir de la banda actual con margen.
+                if level < s.level:
+                    level = max(level, min(s.level, level_of(score, rule.hysteresis)))
+                if level == s.level:
+                    s.candidate = None
+                    continue
+                t = self._time_of(stamps[i])
+                if math.isnan(t):
+                    t = received_at
+                if s.candidate != level:
+                    s.candidate, s.since, s.count = level, t, 0
+                s.count += 1
+                if s.count < rule.min_readings or t - s.since < rule.min_duration_s:
+                    continue
+                o = origin[i] if origin is not None and not math.isnan(origin[i]) else received_at
+                alert = self._transition(sid, s, level, score, stamps[i], lat[i], lon[i], t, o, rule)
+                if alert is not None:
+                    out.append(alert)
+            self.stats["readings"] += n
+            self.stats["batches"] += 1
+        self.batch_latencies.append(time.time() - received_at)
+        if out:
+            self._queue.put(out)
+        return out
+
+    def _transition(self, sid, s, level, score, ts, lat, lon, t, origin, rule):
+        old = s.level
+        s.level, s.candidate = level, None
+        if level > old and level >= rule.min_level:
+            kind = "raised" if old < rule.min_level else "escalated"
+            last = s.last_sent.get(level)
+            if last is not None and t - last < rule.cooldown_s:
+                self.stats["suppressed_cooldown"] += 1
+                s.notified = False
+                return None
+            if not self._take_token():
+                # Sin cupo el nivel no sube, así que no se pierde: la siguiente lectura lo reintenta.
+                self.stats["suppressed_rate"] += 1
+                s.level, s.candidate = old, level
+                return None
+            s.last_sent[level] = t
+            s.notified = True
+        elif level < old and old >= rule.min_level:
+            kind = "cleared" if level < rule.min_level else "lowered"
+            # Solo se avisa que bajó si se avisó que había subido.
+            if not s.notified:
+                return None
+            s.notified = level >= rule.min_level
+        else:
+            return None
+        now = time.time()
+        latency = now - origin
+        self.latencies.append(latency)
+        self.stats["alerts"] += 1
+        return {
+            "sensor_id": str(sid),
+            "kind": kind,
+            "level": LEVELS[level],
+            "previous": LEVELS[old],
+            "score": None if math.isnan(score) else round(float(score), 4),
+            "timestamp": None if ts is None else str(ts),
+            "lat": None if math.isnan(lat) else float(lat),
+            "lon": None if math.isnan(lon) else float(lon),
+            "detected_at": datetime.fromtimestamp(now).isoformat(timespec="milliseconds"),
+            "latency_ms": round(latency * 1000, 2),
+        }
+
+    def _dispatch(self):
+        while True:
+            alerts = self._queue.get()
+            if alerts is None:
+                return
+            for sink in list(self.sinks):
+                try:
+                    sink(alerts)
+                except Exception as e:
+                    self.stats["sink_errors"] += 1
+                    self.stats["last_error"] = f"{type(e).__name__}: {e}"
+
+    def active(self):
+        """Sensores en alerta (nivel confirmado en o sobre el ``min_level`` de su regla), ``sensor_id -> nivel``."""
+        with self._lock:
+            default, rules = self.rule, self.rules
+            return {sid: LEVELS[s.level] for sid, s in self._sensors.items()
+                    if s.level and s.level >= rules.get(sid, default).min_level}
+
+    def snapshot(self):
+        """Contadores y percentiles (ms) de latencia lectura→alerta y por lote."""
+        out = dict(self.stats)
+        for name, samples in (("alert", self.latencies), ("batch", self.batch_latencies)):
+            lat = np.asarray(samples, dtype=float) * 1000
+            for p in (50, 95, 99):
+                out[f"{name}_latency_p{p}_ms"] = float(np.percentile(lat, p)) if len(lat) else math.nan
+        out["over_budget"] = int((np.asarray(self.latencies) * 1000 > LATENCY_BUDGET_MS).sum())
+        return out
+
+    def stop(self, timeout=2.0):
+        self._queue.put(None)
+        self._dispatcher.join(timeout)
@@ -0,0 +1,203 @@
+"""
+Benchmarks reproducibles de las rutas principales.
+
+Genera datos con ``pyroguard.synthetic`` a la escala pedida, mide cada caso
+(mejor y mediana de ``--repeat`` corridas) y emite JSON para comparar corridas
+en el tiempo::
+
+    python -m pyroguard.bench --sensors 1000 --readings 100 --out bench.json
+    python -m pyroguard.bench --sensors 1000 --readings 100 --compare bench.json
+
+Casos: puntaje y etiquetas (vectorizado y por fila), parser de telemetría
+(lotes y línea por línea), append/lectura/compactación del almacén,
+resolución de posiciones con overrides, carga de FIRMS, cruce con focos,
+capas del mapa, tabla de estado por sensor y matriz de ETA de despacho.
+"""
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from . import risk, synthetic
+from .config import CENTER
+from .dispatch import TrafficField, demo_units, eta_matrix
+from .firms import bbox_around, load_firms
+from .mapagg import risk_map_payload
+from .positions import OverrideCache, PositionTable, resolve_positions
+from .spatial import HotspotIndex
+from .state import SensorStateTable
+from .store import TelemetryStore
+from .telemetry import parse_telemetry_batch, parse_telemetry_line, synthetic_lines
+
+# Los casos por fila se miden sobre una muestra para no dominar la corrida.
+ROWWISE_SAMPLE = 5000
+LINE_SAMPLE = 1000
+# Escala de la matriz de despacho: unidades × incidentes.
+DISPATCH_UNITS = 500
+DISPATCH_INCIDENTS = 5000
+
+
+def measure(fn, repeat=3, setup=None):
+    """Tiempos (s) de ``repeat`` corridas de ``fn(setup())``; ``setup`` no se mide."""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        t0 = time.perf_counter()
+        fn(arg) if setup is not None else fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def _result(times, rows):
+    best = min(times)
+    return {
+        "rows": int(rows),
+        "best_s": round(best, 6),
+        "median_s": round(statistics.median(times), 6),
+        "rows_per_s": round(rows / best, 1) if best > 0 else None,
+    }
+
+
+def run(sensors=1000, readings=100, firms_rows=100_000, line_batch=10_000, repeat=3, seed=0, only=None):
+    """Corre los casos y devuelve ``{"meta": ..., "results": {caso: {...}}}``."""
+    df = synthetic.sensor_frame(sensors, readings, seed=seed)
+    n = len(df)
+    sample = df.head(min(n, ROWWISE_SAMPLE))
+    lines = synthetic_lines(n, sensors, seed=seed)
+    results = {}
+
+    def case(name, fn, rows, setup=None):
+        if only and not any(name.startswith(o) for o in only):
+            return
+        results[name] = _result(measure(fn, repeat, setup), rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # --- riesgo ---
+        case("risk.score_labels", lambda: risk.labels(risk.score(df)), n)
+        case("risk.calc_risk_score_rowwise",
+             lambda: [risk.label_from_score(risk.calc_risk_score(r)) for r in sample.to_dict("records")], len(sample))
+
+        # --- parser ---
+        case("telemetry.parse_batch", lambda: [parse_telemetry_batch(lines[i:i + line_batch]) for i in range(0, n, line_batch)], n)
+        case("telemetry.parse_line", lambda: [parse_telemetry_line(ln) for ln in lines[:LINE_SAMPLE]], min(n, LINE_SAMPLE))
+
+        # --- almacén: append por lotes, lectura con dedupe y compactación ---
+        counter = iter(range(10 ** 9))
+        chunk = max(1, n // 20)
+
+        def fresh_store():
+            return TelemetryStore(os.path.join(tmp, f"store-{next(counter)}"), compact_threshold=10 ** 9, background=False)
+
+        def filled_store():
+            store = fresh_store()
+            for i in range(0, n, chunk):
+                store.append(df.iloc[i:i + chunk])
+            # La mitad de los lotes se reescribe: la lectura debe deduplicar.
+            store.append(df.iloc[: n // 2])
+            return store
+
+        case("store.append", lambda s: [s.append(df.iloc[i:i + chunk]) for i in range(0, n, chunk)], n, setup=fresh_store)
+        case("store.read_dedupe", lambda s: s.read(), n + n // 2, setup=filled_store)
+        case("store.compact", lambda s: s.compact(), n + n // 2, setup=filled_store)
+
+        # --- posiciones ---
+        ovr_path = os.path.join(tmp, "overrides.json")
+        with open(ovr_path, "w", encoding="utf-8") as f:
+            json.dump(synthetic.overrides_for(sensors, seed=seed), f)
+        table = PositionTable(OverrideCache(ovr_path))
+        resolve_positions(df.head(1), table)
+        case("positions.resolve", lambda: resolve_positions(df, table), n)
+        case("positions.resolve_cold", lambda t: resolve_positions(df, t), n,
+             setup=lambda: PositionTable(OverrideCache(ovr_path)))
+
+        # --- FIRMS y focos ---
+        firms_path = synthetic.write_firms_csv(os.path.join(tmp, "firms.csv"), firms_rows, seed=seed)
+        case("firms.load_bbox", lambda: load_firms(firms_path, bbox=bbox_around()), firms_rows)
+        firms, _ = load_firms(firms_path)
+        case("spatial.build_index", lambda: HotspotIndex.from_frame(firms), len(firms))
+        index = HotspotIndex.from_frame(firms)
+        resolved = resolve_positions(df, table)
+        case("spatial.annotate", lambda: index.annotate(resolved), n)
+
+        # --- mapa y estado ---
+        dff = resolved.assign(latitude=resolved["lat"], longitude=resolved["lon"])
+        case("mapagg.risk_map_payload", lambda: risk_map_payload(dff, 9), n)
+        case("state.from_history", lambda: SensorStateTable.from_history(df), n)
+        state = SensorStateTable.from_history(df)
+        last = df.iloc[-1].to_dict()
+
+        def changed_state():
+            # Misma lectura con otra temperatura: invalida el snapshot y obliga a reconstruirlo.
+            state.update({**last, "temp_c": last["temp_c"] + next(counter) * 1e-6})
+            return state
+
+        case("state.snapshot", lambda s: s.snapshot(), sensors, setup=changed_state)
+
+        # --- despacho ---
+        units = demo_units(DISPATCH_UNITS, CENTER, seed=seed)
+        incidents = demo_units(DISPATCH_INCIDENTS, CENTER, radius_km=40.0, seed=seed + 1)
+        pairs = DISPATCH_UNITS * DISPATCH_INCIDENTS
+        case("dispatch.eta_matrix", lambda: eta_matrix(*units, *incidents, traffic=6), pairs)
+        case("dispatch.eta_matrix_urban", lambda: eta_matrix(*units, *incidents, traffic=TrafficField(*CENTER)), pairs)
+
+    meta = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "params": {"sensors": sensors, "readings": readings, "firms_rows": firms_rows,
+                   "line_batch": line_batch, "repeat": repeat, "seed": seed},
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(current, baseline):
+    """Filas ``(caso, base_s, actual_s, razón)``; razón > 1 es más lento que la base."""
+    rows = []
+    for name, res in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base:
+            rows.append((name, base["best_s"], res["best_s"], res["best_s"] / base["best_s"] if base["best_s"] else float("nan")))
+    return rows
+
+
+def _main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Benchmarks de PyroGuard con datos sintéticos; salida JSON.")
+    ap.add_argument("--sensors", type=int, default=1000)
+    ap.add_argument("--readings", type=int, default=100, help="lecturas por sensor")
+    ap.add_argument("--firms", type=int, default=100_000, help="filas del CSV de FIRMS")
+    ap.add_argument("--line-batch", type=int, default=10_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--only", nargs="*", help="prefijos de casos a correr (p. ej. risk store)")
+    ap.add_argument("--out", help="archivo JSON de salida (por defecto, stdout)")
+    ap.add_argument("--compare", help="JSON de una corrida anterior para comparar")
+    args = ap.parse_args(argv)
+
+    report = run(args.sensors, args.readings, args.firms, args.line_batch, args.repeat, args.seed, args.only)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for name, base_s, cur_s, ratio in compare(report, baseline):
+            print(f"{name:32s} {base_s:10.4f}s -> {cur_s:10.4f}s  x{ratio:.2f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    _main()
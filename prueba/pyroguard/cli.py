@@ -0,0 +1,253 @@
+"""
+CLI de PyroGuard (``python -m pyroguard``).
+
+``score`` procesa historiales de cualquier tamaño sin cargarlos completos:
+el archivo se divide en rangos de bytes que terminan en fin de línea, cada
+proceso del pool lee su rango, resuelve posiciones, puntúa y escribe su
+propio segmento Parquet. Al proceso principal solo regresan contadores, así
+que el rendimiento crece con el número de núcleos::
+
+    python -m pyroguard score historial.csv --out puntuado/ --workers 8
+    python -m pyroguard score arduino.log --format serial --sensor-id Nodo-7 --out log/
+
+Un log serial es una lectura por línea (``T:29.8 H:39 ...``); si la línea
+empieza con un timestamp ISO (``2025-10-05T15:13:40 T:29.8 ...``) se usa como
+hora de la lectura. Los CSV deben tener encabezado y no traer saltos de línea
+dentro de campos entrecomillados.
+
+``bench``, ``gateway`` y ``loadgen`` delegan en sus módulos.
+"""
+import os
+import re
+import sys
+import time
+
+# Rango de bytes por tarea; varias tareas por proceso equilibran la carga.
+CHUNK_MB = 32
+
+_LEADING_TS = re.compile(rb"^\s*\[?(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?)\]?\s*")
+
+# Estado por proceso del pool (lo llena ``_init_worker``).
+_WORKER = {}
+
+
+def byte_ranges(path, chunk_bytes, start=0):
+    """Rangos ``(inicio, fin)`` de ~``chunk_bytes`` que terminan en fin de línea."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        pos = start
+        while pos < size:
+            end = min(pos + chunk_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((pos, end))
+            pos = end
+    return ranges
+
+
+def read_header(path):
+    """Nombres de columna y tamaño en bytes del encabezado de un CSV."""
+    with open(path, "rb") as f:
+        line = f.readline()
+    names = [c.strip().strip('"') for c in line.decode("utf-8-sig").rstrip("\r\n").split(",")]
+    return names, len(line)
+
+
+def output_schema(with_hotspots):
+    import pyarrow as pa
+
+    from .store import SCHEMA
+
+    if not with_hotspots:
+        return SCHEMA
+    return pa.schema(list(SCHEMA) + [
+        pa.field("hotspot_dist_km", pa.float64()),
+        pa.field("hotspot_count", pa.int64()),
+        pa.field("hotspot_proximity", pa.float64()),
+    ])
+
+
+def _init_worker(opts):
+    from . import risk
+    from .positions import OverrideCache, PositionTable
+
+    _WORKER.clear()
+    _WORKER["opts"] = opts
+    _WORKER["weights"] = risk.RiskWeights(*opts["weights"]) if opts.get("weights") else risk.DEFAULT_WEIGHTS
+    _WORKER["positions"] = PositionTable(OverrideCache(opts["overrides"])) if opts.get("overrides") else None
+    _WORKER["hotspots"] = None
+    if opts.get("firms"):
+        from .firms import load_firms
+        from .spatial import HotspotIndex
+
+        firms, _ = load_firms(opts["firms"])
+        _WORKER["hotspots"] = HotspotIndex.from_frame(firms)
+
+
+def _score_csv(data, opts):
+    import io
+
+    import pandas as pd
+
+    from . import risk
+    from .positions import resolve_positions
+    from .store import _conform
+
+    df = pd.read_csv(io.BytesIO(data), header=None, names=opts["header"],
+                     dtype={"sensor_id": str, "timestamp": str, "risk_label": str})
+    rows_in = len(df)
+    df = _conform(df)
+    df = resolve_positions(df, _WORKER["positions"])
+    if _WORKER["hotspots"] is not None:
+        df = _WORKER["hotspots"].annotate(df)
+    scores = risk.score(df, _WORKER["weights"])
+    df["risk_score"] = scores
+    df["risk_label"] = risk.labels(scores)
+    return df, rows_in
+
+
+def _score_serial(data, opts):
+    from .telemetry import parse_telemetry_batch
+
+    lines, stamps = [], []
+    default_ts = opts["timestamp"]
+    for raw in data.splitlines():
+        m = _LEADING_TS.match(raw)
+        if m:
+            stamps.append(m.group(1).decode().replace(" ", "T"))
+            raw = raw[m.end():]
+        else:
+            stamps.append(default_ts)
+        lines.append(raw.decode(errors="ignore"))
+    df = parse_telemetry_batch(lines, sensor_id=opts["sensor_id"], timestamp=stamps, weights=_WORKER["weights"],
+                               positions=_WORKER["positions"], hotspots=_WORKER["hotspots"])
+    return df, len(lines)
+
+
+def _score_range(task):
+    """Procesa un rango del archivo y escribe su segmento; devuelve contadores."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    index, start, end = task
+    opts = _WORKER["opts"]
+    t0 = time.perf_counter()
+    with open(opts["path"], "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    fn = _score_csv if opts["format"] == "csv" else _score_serial
+    df, rows_in = fn(data, opts)
+    schema = output_schema(_WORKER["hotspots"] is not None)
+    table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+    path = os.path.join(opts["out"], f"part-{index:05d}.parquet")
+    pq.write_table(table, path, compression=opts["compression"])
+    return {"rows_in": rows_in, "rows_out": len(df), "bytes": end - start, "seconds": time.perf_counter() - t0}
+
+
+def score_file(path, out, fmt="csv", workers=None, chunk_mb=CHUNK_MB, sensor_id=None, timestamp=None,
+               overrides=None, firms=None, weights=None, compression="zstd", progress=None):
+    """
+    Puntúa ``path`` y escribe un dataset Parquet en el directorio ``out``
+    (``part-00000.parquet``, ... en el orden del archivo). Devuelve un resumen.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from .config import DEFAULT_SENSOR_ID, OVR_PATH
+
+    start = 0
+    header = None
+    if fmt == "csv":
+        header, start = read_header(path)
+    ranges = byte_ranges(path, int(chunk_mb * 1024 * 1024), start)
+    os.makedirs(out, exist_ok=True)
+    for name in os.listdir(out):
+        if name.startswith("part-") and name.endswith(".parquet"):
+            os.remove(os.path.join(out, name))
+
+    opts = {
+        "path": path, "out": out, "format": fmt, "header": header,
+        "sensor_id": sensor_id or DEFAULT_SENSOR_ID,
+        "timestamp": timestamp or time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "overrides": overrides or OVR_PATH, "firms": firms,
+        "weights": tuple(weights) if weights else None, "compression": compression,
+    }
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    totals = {"rows_in": 0, "rows_out": 0, "bytes": 0, "parts": len(ranges)}
+    tasks = [(i, s, e) for i, (s, e) in enumerate(ranges)]
+    if workers == 1:
+        _init_worker(opts)
+        results = map(_score_range, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(opts,))
+        results = pool.map(_score_range, tasks)
+    try:
+        for done, r in enumerate(results, 1):
+            for k in ("rows_in", "rows_out", "bytes"):
+                totals[k] += r[k]
+            if progress is not None:
+                progress(done, len(tasks), totals)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.perf_counter() - t0
+    totals.update(workers=workers, seconds=elapsed,
+                  rows_per_s=totals["rows_in"] / elapsed if elapsed > 0 else 0.0,
+                  mb_per_s=totals["bytes"] / 1e6 / elapsed if elapsed > 0 else 0.0)
+    return totals
+
+
+def _cmd_score(args):
+    def progress(done, total, t):
+        print(f"\r{done}/{total} rangos, {t['rows_in']:,} filas", end="", file=sys.stderr, flush=True)
+
+    weights = None
+    if args.weights:
+        weights = [float(x) for x in args.weights.split(",")]
+    s = score_file(args.input, args.out, fmt=args.format, workers=args.workers, chunk_mb=args.chunk_mb,
+                   sensor_id=args.sensor_id, timestamp=args.timestamp, overrides=args.overrides,
+                   firms=args.firms, weights=weights, compression=args.compression,
+                   progress=None if args.quiet else progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"{s['rows_in']:,} filas leídas, {s['rows_out']:,} escritas en {s['parts']} segmentos "
+          f"con {s['workers']} procesos: {s['seconds']:.2f} s ({s['rows_per_s']:,.0f} filas/s, {s['mb_per_s']:.1f} MB/s)")
+
+
+def main(argv=None):
+    import argparse
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # Subcomandos que ya tienen su propio CLI.
+    delegated = {"bench": "bench", "gateway": "gateway", "loadgen": "loadgen"}
+    if argv and argv[0] in delegated:
+        import importlib
+
+        return importlib.import_module(f".{delegated[argv[0]]}", __package__)._main(argv[1:])
+
+    ap = argparse.ArgumentParser(prog="pyroguard", description="Herramientas de línea de comandos de PyroGuard Nexus.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    for name in delegated:
+        sub.add_parser(name, help=f"ver: python -m pyroguard {name} --help", add_help=False)
+
+    sc = sub.add_parser("score", help="puntúa un CSV histórico o un log serial y escribe Parquet")
+    sc.add_argument("input")
+    sc.add_argument("--out", required=True, help="directorio del dataset Parquet de salida")
+    sc.add_argument("--format", choices=("csv", "serial"), default="csv")
+    sc.add_argument("--workers", type=int, default=None, help="procesos (por defecto, núcleos disponibles)")
+    sc.add_argument("--chunk-mb", type=float, default=CHUNK_MB, help="MB por rango de lectura")
+    sc.add_argument("--sensor-id", help="sensor para líneas sin ID: (solo logs seriales)")
+    sc.add_argument("--timestamp", help="timestamp ISO para líneas sin hora (solo logs seriales)")
+    sc.add_argument("--overrides", help="overrides.json a usar (por defecto, el del dashboard)")
+    sc.add_argument("--firms", help="CSV de FIRMS para agregar cercanía a focos")
+    sc.add_argument("--weights", help="w_temp,w_hum,w_wind,w_dry,w_smoke,bias[,w_fire]")
+    sc.add_argument("--compression", default="zstd")
+    sc.add_argument("--quiet", action="store_true")
+    sc.set_defaults(func=_cmd_score)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
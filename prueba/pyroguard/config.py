@@ -0,0 +1,15 @@
+"""
+Constantes compartidas entre el dashboard, el CLI y los servicios de ingesta.
+"""
+CENTER = [25.4389, -100.9733]  # Saltillo
+DATA_DIR = "data"
+CSV_PATH = f"{DATA_DIR}/mock_sensors.csv"
+OVR_PATH = f"{DATA_DIR}/overrides.json"
+STORE_DIR = f"{DATA_DIR}/store"
+ALERTS_PATH = f"{DATA_DIR}/alerts.jsonl"
+METRICS_PATH = f"{DATA_DIR}/metrics.prom"
+
+DEFAULT_SENSOR_ID = "Arduino-Live"
+
+# Columnas de una lectura, en el orden del CSV histórico.
+COLUMNS = ["sensor_id","lat","lon","timestamp","temp_c","humidity_pct","wind_ms","smoke_ppm","fuel_dryness","risk_score","risk_label"]
@@ -0,0 +1,114 @@
+"""
+Carga de focos de calor NASA FIRMS (MODIS/VIIRS) por bloques.
+
+Un día global de VIIRS son cientos de miles de filas; aquí solo se leen las
+columnas que usamos, con tipos compactos, y se filtra al área de interés
+mientras se lee, de modo que nunca se materializa el archivo completo.
+"""
+import hashlib
+import io
+import math
+from datetime import datetime
+from typing import NamedTuple
+
+import pandas as pd
+
+from .config import CENTER
+
+# Nombre normalizado -> nombres aceptados en el CSV (en orden de preferencia).
+COLUMN_ALIASES = {
+    "latitude": ("latitude", "lat"),
+    "longitude": ("longitude", "lon", "long"),
+    "date": ("acq_date", "date"),
+    "brightness": ("bright_ti4", "brightness", "bright_ti5"),
+}
+DTYPES = {"latitude": "float32", "longitude": "float32", "brightness": "float32", "date": "string"}
+
+KM_PER_DEG_LAT = 111.32
+
+
+class FirmsStats(NamedTuple):
+    rows_scanned: int
+    rows_kept: int
+    chunks: int
+
+
+def firms_template():
+    return pd.DataFrame({
+        "latitude": [CENTER[0]+0.05, CENTER[0]-0.07, CENTER[0]+0.12],
+        "longitude": [CENTER[1]-0.06, CENTER[1]+0.03, CENTER[1]+0.08],
+        "date": [str(datetime.now().date())]*3,
+        "brightness": [330.1, 342.5, 318.9],
+    })
+
+
+def detect_columns(columns):
+    """Mapea nombres normalizados a las columnas reales del archivo (sin distinguir mayúsculas)."""
+    cols_lower = {c.lower(): c for c in columns}
+    found = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in cols_lower:
+                found[name] = cols_lower[alias]
+                break
+    return found
+
+
+def bbox_around(center=CENTER, radius_km=100.0):
+    """Caja (lat_min, lat_max, lon_min, lon_max) que contiene un círculo de ``radius_km``."""
+    dlat = radius_km / KM_PER_DEG_LAT
+    dlon = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(center[0])), 1e-6))
+    return (center[0] - dlat, center[0] + dlat, center[1] - dlon, center[1] + dlon)
+
+
+def file_digest(data: bytes):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _as_buffer(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+def load_firms(source, bbox=None, chunksize=250_000):
+    """
+    Lee un CSV de FIRMS (ruta, archivo abierto o bytes) y devuelve
+    ``(df, FirmsStats)``.
+
+    ``df`` tiene solo ``latitude``, ``longitude`` y, si existen, ``date`` y
+    ``brightness``. Con ``bbox`` se conservan únicamente los focos dentro de la
+    caja. Lanza ``ValueError`` si no hay columnas de latitud/longitud.
+    """
+    buf = _as_buffer(source)
+    start = buf.tell() if hasattr(buf, "tell") else None
+    header = pd.read_csv(buf, nrows=0).columns
+    if start is not None:
+        buf.seek(start)
+    found = detect_columns(header)
+    if not ("latitude" in found and "longitude" in found):
+        raise ValueError("No se encontraron columnas de latitud/longitud.")
+
+    rename = {orig: name for name, orig in found.items()}
+    dtypes = {orig: DTYPES[name] for name, orig in found.items()}
+    scanned, chunks, parts = 0, 0, []
+    for chunk in pd.read_csv(buf, usecols=list(rename), dtype=dtypes, chunksize=chunksize):
+        chunks += 1
+        scanned += len(chunk)
+        chunk = chunk.rename(columns=rename)
+        if bbox is not None:
+            lat = chunk["latitude"].to_numpy()
+            lon = chunk["longitude"].to_numpy()
+            keep = (lat >= bbox[0]) & (lat <= bbox[1]) & (lon >= bbox[2]) & (lon <= bbox[3])
+            chunk = chunk[keep]
+        if len(chunk):
+            parts.append(chunk)
+
+    cols = [c for c in COLUMN_ALIASES if c in found]
+    if parts:
+        firms = pd.concat(parts, ignore_index=True)[cols]
+    else:
+        firms = pd.DataFrame({c: pd.Series(dtype=DTYPES[c]) for c in cols})
+    if "date" in firms.columns:
+        firms["date"] = firms["date"].astype("category")
+    return firms, FirmsStats(scanned, len(firms), chunks)
@@ -0,0 +1,388 @@
+"""
+Gateway de ingesta para muchos nodos (uplinks estilo LoRaWAN) sobre la red local.
+
+Un solo proceso asyncio escucha uplinks por UDP (un datagrama puede traer
+varias líneas) y/o TCP (una línea por lectura). Cada línea usa el protocolo
+del Arduino más el identificador del nodo, p. ej.
+``ID:S-1001 T:29.8 H:39 W:3.1 SM:12 DRY:0.7``.
+
+Las líneas se acumulan en una cola acotada; un escritor las parsea por lotes
+y las escribe en bloque al ``TelemetryStore`` del dashboard en un hilo aparte.
+Si el almacén se atrasa y la cola se llena, las conexiones TCP dejan de leerse
+(el control de flujo de TCP frena al emisor) y los datagramas UDP se
+descartan y se cuentan en ``dropped``.
+
+Si una línea trae ``TX:<epoch>`` (segundos), esa hora del nodo es el
+timestamp de la lectura y se mide la latencia extremo a extremo hasta que
+queda escrita en el almacén. Sin ``TX:`` (o con un reloj fuera de rango) el
+timestamp es la hora de llegada de la línea, con milisegundos.
+
+Uso::
+
+    python -m pyroguard.gateway --udp 0.0.0.0:1700 --tcp 0.0.0.0:1701
+"""
+import asyncio
+import math
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .alerts import LATENCY_BUDGET_MS
+from .config import DEFAULT_SENSOR_ID, STORE_DIR
+from .telemetry import epoch_stamps, parse_telemetry_batch
+
+# Clave opcional con la hora de envío del nodo (epoch en segundos).
+TX_KEY = "tx"
+# Rango aceptado para ``TX:`` (2000-01-01 a 2100-01-01); fuera de él el reloj del nodo no sirve.
+TX_RANGE = (946684800.0, 4102444800.0)
+
+
+_PARSE = metrics.stage("gateway_parse")
+_LISTENERS = metrics.stage("gateway_listeners")
+_PERSIST = metrics.stage("gateway_persist")
+_LINES_READ = metrics.counter("pyroguard_lines_read_total", "Líneas recibidas.", source="gateway")
+_LINES_PARSED = metrics.counter("pyroguard_lines_parsed_total", "Líneas parseadas como lectura válida.", source="gateway")
+_LINES_REJECTED = metrics.counter("pyroguard_lines_rejected_total", "Líneas descartadas por el parser.", source="gateway")
+_DROPPED = metrics.counter("pyroguard_lines_dropped_total", "Líneas UDP descartadas con la cola llena.", source="gateway")
+
+def parse_address(text, default_host="0.0.0.0"):
+    """``"host:puerto"`` o ``"puerto"`` -> ``(host, puerto)``."""
+    host, _, port = str(text).rpartition(":")
+    return host or default_host, int(port)
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    def datagram_received(self, data, addr):
+        self.gateway._offer(data)
+
+
+class Gateway:
+    """
+    Recibe uplinks, los agrupa en lotes y los escribe en ``store``.
+
+    - ``queue_lines``: capacidad de la cola; es el límite de memoria y el punto
+      donde empieza la contrapresión.
+    - ``batch_lines`` / ``batch_interval``: un lote se parsea al juntar
+      ``batch_lines`` líneas o al pasar ``batch_interval`` segundos, y se
+      entrega a los ``listeners`` (``fn(df, received_at)``, p. ej. alertas).
+    - ``write_interval``: los lotes parseados se escriben juntos al almacén
+      cada ``write_interval`` segundos (o al sumar ``batch_lines`` filas).
+    - ``sink``: alternativa a ``store`` (cualquier callable que reciba el
+      DataFrame del lote). Si devuelve un entero, ``rows_written`` cuenta
+      eso (las filas que sobrevivieron a la deduplicación) y no el lote.
+    """
+
+    def __init__(self, store=None, sink=None, sensor_id=DEFAULT_SENSOR_ID, queue_lines=100_000,
+                 batch_lines=5000, batch_interval=0.05, write_interval=0.25, hotspots=None, listeners=None,
+                 latency_samples=100_000):
+        if sink is None and store is None:
+            raise ValueError("Se requiere un almacén o un sink.")
+        self.sink = sink if sink is not None else store.append
+        self.sensor_id = sensor_id
+        self.queue_lines = queue_lines
+        self.batch_lines = batch_lines
+        self.batch_interval = batch_interval
+        self.write_interval = write_interval
+        self.hotspots = hotspots
+        self.listeners = list(listeners) if listeners else []
+        self.latencies = deque(maxlen=latency_samples)
+        self.stats = {
+            "lines_received": 0,
+            "lines_parsed": 0,
+            "lines_rejected": 0,
+            "rows_written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "write_errors": 0,
+            "parse_errors": 0,
+            "listener_errors": 0,
+            "last_error": None,
+            "started_at": None,
+        }
+        self._queue = None
+        self._servers = []
+        self._transports = []
+        self._writer_task = None
+        self._unwritten = []
+        self._unwritten_rows = 0
+        self._write_task = None
+
+    # --- entrada ---
+    def _lines(self, data):
+        return [ln for ln in data.decode(errors="ignore").splitlines() if ln.strip()]
+
+    def _offer(self, data):
+        """Entrada sin espera (UDP): si la cola está llena, la línea se descarta."""
+        now = time.time()
+        for j, line in enumerate(self._lines(data)):
+            self.stats["lines_received"] += 1
+            try:
+                # Las líneas de un datagrama llegan juntas: 1 ms de separación entre ellas
+                # evita que dos lecturas del mismo sensor sin ``TX:`` compartan timestamp.
+                self._queue.put_nowait((line, now + j * 0.001))
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+                _DROPPED.inc()
+
+    async def _handle_tcp(self, reader, writer):
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode(errors="ignore").strip()
+                if line:
+                    self.stats["lines_received"] += 1
+                    # Con la cola llena se espera aquí y se deja de leer el socket.
+                    await self._queue.put((line, time.time()))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # --- parseo y escritura ---
+    async def _next_batch(self, timeout=None):
+        """
+        Espera la primera línea (hasta ``timeout`` segundos; ``[]`` si no llega)
+        y junta las que lleguen durante ``batch_interval``.
+        """
+        try:
+            first = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return [], None
+        received_at = time.time()
+        batch = [first]
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_lines:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch, received_at
+
+    def _parse(self, items, received_at):
+        lines = [line for line, _ in items]
+        with _PARSE.time():
+            df = parse_telemetry_batch(lines, sensor_id=self.sensor_id, extra_keys=True, hotspots=self.hotspots,
+                                       timestamp=epoch_stamps([t for _, t in items]))
+            if TX_KEY in df.columns:
+                tx = df[TX_KEY].to_numpy(dtype=float)
+                ok = (tx >= TX_RANGE[0]) & (tx < TX_RANGE[1])
+                if ok.any():
+                    stamps = df["timestamp"].to_numpy(dtype=object)
+                    stamps[ok] = epoch_stamps(tx[ok])
+                    df["timestamp"] = stamps
+        _LINES_READ.inc(len(lines))
+        _LINES_PARSED.inc(len(df))
+        _LINES_REJECTED.inc(len(lines) - len(df))
+        if len(df):
+            with _LISTENERS.time():
+                for listener in list(self.listeners):
+                    try:
+                        listener(df, received_at)
+                    except Exception as e:
+                        self.stats["listener_errors"] += 1
+                        self.stats["last_error"] = f"{type(e).__name__}: {e}"
+        return df
+
+    def _write(self, frames):
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        with _PERSIST.time():
+            written = self.sink(df)
+        # Un ciclo del perfilador "gateway" va de una escritura a la siguiente; el
+        # trabajo salta entre el loop y el executor, así que se muestrean todos los hilos.
+        metrics.PROFILER.boundary("gateway", all_threads=True)
+        # ``store.append`` devuelve las filas que quedaron tras deduplicar; otros sinks, nada.
+        if not isinstance(written, int):
+            written = len(df)
+        return df, written, time.time()
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        t_write = None
+        while True:
+            timeout = None if t_write is None else max(0.0, t_write - time.monotonic())
+            batch, received_at = await self._next_batch(timeout)
+            if batch:
+                try:
+                    df = await loop.run_in_executor(None, self._parse, batch, received_at)
+                except Exception as e:
+                    self.stats["parse_errors"] += len(batch)
+                    self.stats["last_error"] = f"{type(e).__name__}: {e}"
+                    df = None
+                if df is not None:
+                    self.stats["batches"] += 1
+                    self.stats["lines_parsed"] += len(df)
+                    self.stats["lines_rejected"] += len(batch) - len(df)
+                    if len(df):
+                        self._unwritten.append(df)
+                        self._unwritten_rows += len(df)
+                        if t_write is None:
+                            t_write = time.monotonic() + self.write_interval
+            if self._unwritten and (self._unwritten_rows >= self.batch_lines or time.monotonic() >= t_write):
+                # Una sola escritura en vuelo y en segundo plano: el parseo (y las alertas)
+                # siguen mientras tanto. Si el almacén no alcanza, aquí se espera y la cola se llena.
+                if self._write_task is not None and not self._write_task.done():
+                    if self._unwritten_rows < 4 * self.batch_lines:
+                        t_write = time.monotonic() + self.batch_interval
+                        continue
+                    await self._write_task
+                frames, self._unwritten, self._unwritten_rows = self._unwritten, [], 0
+                t_write = None
+                self._write_task = asyncio.ensure_future(self._write_frames(frames))
+
+    async def _write_frames(self, frames):
+        loop = asyncio.get_running_loop()
+        try:
+            df, written, written_at = await loop.run_in_executor(None, self._write, frames)
+        except Exception as e:
+            self.stats["write_errors"] += 1
+            self.stats["last_error"] = f"{type(e).__name__}: {e}"
+            return
+        self.stats["rows_written"] += written
+        if TX_KEY in df.columns:
+            tx = df[TX_KEY].to_numpy(dtype=float)
+            self.latencies.extend(written_at - tx[~np.isnan(tx)])
+
+    # --- ciclo de vida ---
+    async def start(self, udp=None, tcp=None):
+        """Abre los listeners (``(host, puerto)``); devuelve las direcciones reales."""
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.queue_lines)
+        self.stats["started_at"] = time.time()
+        self._writer_task = asyncio.create_task(self._writer())
+        bound = {}
+        if udp is not None:
+            transport, _ = await loop.create_datagram_endpoint(lambda: _UdpProtocol(self), local_addr=udp)
+            self._transports.append(transport)
+            bound["udp"] = transport.get_extra_info("sockname")[:2]
+        if tcp is not None:
+            server = await asyncio.start_server(self._handle_tcp, tcp[0], tcp[1])
+            self._servers.append(server)
+            bound["tcp"] = server.sockets[0].getsockname()[:2]
+        return bound
+
+    async def drain(self, timeout=10.0):
+        """Espera a que la cola se vacíe y el último lote quede escrito."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            done = self.stats["lines_parsed"] + self.stats["lines_rejected"] + self.stats["parse_errors"]
+            writing = self._write_task is not None and not self._write_task.done()
+            if self._queue.empty() and not self._unwritten and not writing and done >= self.stats["lines_received"] - self.stats["dropped"]:
+                return True
+            await asyncio.sleep(0.05)
+        return False
+
+    async def stop(self):
+        for transport in self._transports:
+            transport.close()
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._transports, self._servers = [], []
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        if self._write_task is not None:
+            await self._write_task
+            self._write_task = None
+        if self._unwritten:
+            frames, self._unwritten, self._unwritten_rows = self._unwritten, [], 0
+            await self._write_frames(frames)
+
+    def snapshot(self):
+        """Contadores, profundidad de la cola, lecturas/s y percentiles de latencia (ms)."""
+        out = dict(self.stats)
+        out["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        elapsed = time.time() - out["started_at"] if out["started_at"] else 0.0
+        out["rows_per_s"] = out["rows_written"] / elapsed if elapsed > 0 else 0.0
+        lat = np.asarray(self.latencies, dtype=float)
+        for p in (50, 95, 99):
+            out[f"latency_p{p}_ms"] = float(np.percentile(lat, p) * 1000) if len(lat) else math.nan
+        return out
+
+
+def format_stats(s):
+    return (f"{s['rows_written']:,} escritas ({s['rows_per_s']:,.0f}/s), cola {s['queue_depth']:,}, "
+            f"descartadas {s['dropped']:,}, rechazadas {s['lines_rejected']:,}, "
+            f"latencia p50/p95/p99 {s['latency_p50_ms']:.1f}/{s['latency_p95_ms']:.1f}/{s['latency_p99_ms']:.1f} ms")
+
+
+def format_alert_stats(s):
+    return (f"{s['alerts']:,} alertas, suprimidas {s['suppressed_cooldown'] + s['suppressed_rate']:,}, "
+            f"latencia p50/p95/p99 {s['alert_latency_p50_ms']:.1f}/{s['alert_latency_p95_ms']:.1f}/{s['alert_latency_p99_ms']:.1f} ms, "
+            f"sobre {LATENCY_BUDGET_MS:.0f} ms {s['over_budget']:,}")
+
+
+async def _serve(args):
+    from .store import TelemetryStore
+
+    store = TelemetryStore(args.store)
+    gw = Gateway(store, queue_lines=args.queue, batch_lines=args.batch, batch_interval=args.interval, write_interval=args.write_interval)
+    engine = None
+    if args.alerts:
+        from .alerts import AlertEngine, FileSink
+
+        engine = AlertEngine([FileSink(args.alerts)])
+        gw.listeners.append(engine.consume)
+    bound = await gw.start(udp=parse_address(args.udp) if args.udp else None,
+                           tcp=parse_address(args.tcp) if args.tcp else None)
+    print("Escuchando:", ", ".join(f"{k.upper()} {h}:{p}" for k, (h, p) in bound.items()), flush=True)
+    try:
+        while True:
+            await asyncio.sleep(args.report)
+            print(format_stats(gw.snapshot()), flush=True)
+            if engine is not None:
+                print(format_alert_stats(engine.snapshot()), flush=True)
+            if args.metrics:
+                metrics.REGISTRY.export(args.metrics)
+    finally:
+        await gw.stop()
+        store.close()
+        if engine is not None:
+            engine.stop()
+
+
+def _main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Gateway de ingesta UDP/TCP hacia el almacén de telemetría.")
+    ap.add_argument("--udp", help="host:puerto UDP (p. ej. 0.0.0.0:1700)")
+    ap.add_argument("--tcp", help="host:puerto TCP (p. ej. 0.0.0.0:1701)")
+    ap.add_argument("--store", default=STORE_DIR)
+    ap.add_argument("--queue", type=int, default=100_000, help="capacidad de la cola (líneas)")
+    ap.add_argument("--batch", type=int, default=5000, help="líneas por escritura")
+    ap.add_argument("--interval", type=float, default=0.05, help="segundos máximos por lote parseado")
+    ap.add_argument("--write-interval", type=float, default=0.25, help="segundos entre escrituras al almacén")
+    ap.add_argument("--report", type=float, default=5.0, help="segundos entre reportes")
+    ap.add_argument("--metrics", help="exporta las métricas en cada reporte (texto Prometheus, o JSON si termina en .json)")
+    ap.add_argument("--alerts", help="evalúa alertas y las agrega a este archivo JSONL (p. ej. data/alerts.jsonl)")
+    args = ap.parse_args(argv)
+    if not (args.udp or args.tcp):
+        ap.error("indica al menos --udp o --tcp")
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    _main()
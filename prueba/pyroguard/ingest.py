@@ -0,0 +1,384 @@
+"""
+Ingesta serial en segundo plano.
+
+Un ``SerialReader`` (hilo) por puerto mantiene el puerto abierto, lee líneas
+de forma continua, las parsea por lotes cortos y empuja las lecturas a un
+``RingBuffer`` acotado del que las sesiones del dashboard leen sin bloquear.
+Si el puerto falla se reconecta con backoff exponencial.
+
+El puerto se abre con ``serial.serial_for_url``, así que sirve tanto un
+dispositivo real como un pty o ``loop://`` para pruebas; ``opener`` permite
+inyectar cualquier objeto con ``readline()``/``close()``.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+from . import metrics
+from .config import DEFAULT_SENSOR_ID
+from .telemetry import epoch_stamps, parse_telemetry_batch
+
+try:
+    import serial
+except Exception:
+    serial = None
+
+_OPEN = metrics.stage("serial_open")
+_READLINE = metrics.stage("serial_readline")
+_PARSE = metrics.stage("parse")
+_LISTENERS = metrics.stage("listeners")
+_PERSIST = metrics.stage("persist")
+_LINES_READ = metrics.counter("pyroguard_lines_read_total", "Líneas recibidas.", source="serial")
+_LINES_PARSED = metrics.counter("pyroguard_lines_parsed_total", "Líneas parseadas como lectura válida.", source="serial")
+_LINES_REJECTED = metrics.counter("pyroguard_lines_rejected_total", "Líneas descartadas por el parser.", source="serial")
+_BYTES_READ = metrics.counter("pyroguard_bytes_read_total", "Bytes recibidos.", source="serial")
+
+
+class RingBuffer:
+    """
+    Buffer circular de lecturas con número de secuencia.
+
+    ``read(since)`` devuelve lo agregado después de ``since`` y la nueva
+    secuencia; si el lector se quedó atrás más de ``capacity`` lecturas, las
+    que ya se descartaron y no alcanzó a leer se cuentan en ``overflow``.
+    El desalojo normal de lecturas viejas no cuenta; ``since=0`` (leer lo
+    que haya) tampoco.
+    """
+
+    def __init__(self, capacity=50_000):
+        self.capacity = capacity
+        self._items = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.overflow = 0
+
+    def push(self, records):
+        with self._lock:
+            self._items.extend(records)
+            self._seq += len(records)
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def read(self, since=0):
+        with self._lock:
+            first = self._seq - len(self._items)
+            if 0 < since < first:
+                self.overflow += first - since
+            start = max(since, first) - first
+            items = list(itertools.islice(self._items, start, None))
+            seq = self._seq
+        return seq, items
+
+    def tail(self, n):
+        with self._lock:
+            start = max(0, len(self._items) - n)
+            return list(itertools.islice(self._items, start, None))
+
+    def __len__(self):
+        return len(self._items)
+
+
+def open_serial(port, baudrate, timeout=0.05):
+    """
+    Abre el puerto una sola vez y sin alternar DTR/RTS: cada alternancia
+    reinicia la mayoría de los Arduino.
+    """
+    if serial is None:
+        raise RuntimeError("pyserial no está instalado. Ejecuta: pip install pyserial")
+    return serial.serial_for_url(port, baudrate=int(baudrate), timeout=timeout, write_timeout=0.5)
+
+
+class SerialReader(threading.Thread):
+    """
+    Hilo que mantiene un puerto abierto y publica lecturas parseadas.
+
+    Cada ``batch_interval`` segundos (o cada ``batch_lines`` líneas) el lote
+    acumulado se parsea, se empuja al ``ring`` y se entrega a los
+    ``listeners`` (``fn(df, received_at)``, p. ej. el motor de alertas). Al
+    ``sink`` (p. ej. ``TelemetryStore.append``) se le entregan lotes más
+    grandes, cada ``write_interval`` segundos, para no llenar el almacén de
+    segmentos diminutos. Los errores del sink y de los listeners se cuentan
+    pero no detienen la lectura.
+    """
+
+    def __init__(self, port, ring, baudrate=9600, sensor_id=DEFAULT_SENSOR_ID, sink=None, opener=None,
+                 batch_interval=0.05, batch_lines=1000, write_interval=0.25, listeners=None, backoff=(0.5, 10.0)):
+        super().__init__(name=f"serial-{port}", daemon=True)
+        self.port = port
+        self.baudrate = baudrate
+        self.sensor_id = sensor_id
+        self.ring = ring
+        self.sink = sink
+        self.opener = opener or open_serial
+        self.batch_interval = batch_interval
+        self.batch_lines = batch_lines
+        self.write_interval = write_interval
+        self.listeners = listeners if listeners is not None else []
+        self.backoff = backoff
+        self._unwritten = []
+        self._t_write = None
+        self._stop_evt = threading.Event()
+        self._lock = threading.Lock()
+        # Índice de focos FIRMS vigente (spatial.HotspotIndex); lo fija IngestService.
+        self.hotspots = None
+        self.last_lines = deque(maxlen=50)
+        self.recent = deque(maxlen=500)
+        self.stats = {
+            "state": "iniciando",
+            "lines_read": 0,
+            "lines_parsed": 0,
+            "lines_rejected": 0,
+            "bytes_read": 0,
+            "read_errors": 0,
+            "sink_errors": 0,
+            "listener_errors": 0,
+            "reconnects": 0,
+            "batches": 0,
+            "last_error": None,
+            "last_reading_at": None,
+        }
+
+    def stop(self):
+        self._stop_evt.set()
+
+    @property
+    def running(self):
+        return self.is_alive() and not self._stop_evt.is_set()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, port=self.port, baudrate=self.baudrate)
+
+    def run(self):
+        delay = self.backoff[0]
+        while not self._stop_evt.is_set():
+            try:
+                with _OPEN.time():
+                    ser = self.opener(self.port, self.baudrate)
+            except Exception as e:
+                self._set_error("reconectando", e)
+                self._stop_evt.wait(delay)
+                delay = min(delay * 2, self.backoff[1])
+                continue
+            with self._lock:
+                self.stats["state"] = "conectado"
+            bytes_before = self.stats["bytes_read"]
+            try:
+                self._read_loop(ser)
+            except Exception as e:
+                self._count("read_errors")
+                self._set_error("reconectando", e)
+            finally:
+                try:
+                    ser.close()
+                except Exception:
+                    pass
+            # Si el puerto entregó datos antes de fallar, se reintenta con la espera mínima.
+            if self.stats["bytes_read"] > bytes_before:
+                delay = self.backoff[0]
+            if not self._stop_evt.is_set():
+                self._count("reconnects")
+                self._stop_evt.wait(delay)
+                delay = min(delay * 2, self.backoff[1])
+        with self._lock:
+            self.stats["state"] = "detenido"
+
+    def _set_error(self, state, e):
+        with self._lock:
+            self.stats["state"] = state
+            self.stats["last_error"] = f"{type(e).__name__}: {e}"
+
+    def _read_loop(self, ser):
+        """Lee hasta que se pida detener o el puerto falle."""
+        # Cada línea guarda su hora de llegada: con lotes de 50 ms varias lecturas
+        # del mismo sensor caen en el mismo segundo y el almacén las colapsaría.
+        pending, arrivals = [], []
+        t_flush = time.monotonic() + self.batch_interval
+        try:
+            while not self._stop_evt.is_set():
+                with _READLINE.time():
+                    raw = ser.readline()
+                if raw:
+                    self._count("bytes_read", len(raw))
+                    _BYTES_READ.inc(len(raw))
+                    line = raw.decode(errors="ignore").strip()
+                    if line:
+                        pending.append(line)
+                        arrivals.append(time.time())
+                if pending and (len(pending) >= self.batch_lines or time.monotonic() >= t_flush):
+                    self._flush(pending, arrivals)
+                    pending, arrivals = [], []
+                if time.monotonic() >= t_flush:
+                    t_flush = time.monotonic() + self.batch_interval
+                self._write(force=False)
+        finally:
+            if pending:
+                self._flush(pending, arrivals)
+            self._write(force=True)
+
+    def _flush(self, lines, arrivals):
+        self._count("lines_read", len(lines))
+        self.last_lines.extend(lines)
+        received_at = arrivals[0]
+        with _PARSE.time():
+            df = parse_telemetry_batch(lines, sensor_id=self.sensor_id, hotspots=self.hotspots,
+                                       timestamp=epoch_stamps(arrivals))
+        _LINES_READ.inc(len(lines))
+        _LINES_PARSED.inc(len(df))
+        _LINES_REJECTED.inc(len(lines) - len(df))
+        with self._lock:
+            self.stats["lines_parsed"] += len(df)
+            self.stats["lines_rejected"] += len(lines) - len(df)
+            self.stats["batches"] += 1
+            if len(df):
+                self.stats["last_reading_at"] = time.time()
+        if not len(df):
+            return
+        records = df.assign(port=self.port).to_dict("records")
+        self.recent.extend(records)
+        self.ring.push(records)
+        with _LISTENERS.time():
+            for listener in list(self.listeners):
+                try:
+                    listener(df, received_at)
+                except Exception as e:
+                    self._count("listener_errors")
+                    self._set_error(self.stats["state"], e)
+        if self.sink is not None:
+            self._unwritten.append(df)
+            if self._t_write is None:
+                self._t_write = time.monotonic() + self.write_interval
+
+    def _write(self, force):
+        """Entrega al sink lo acumulado si pasó ``write_interval`` (o si ``force``)."""
+        if not self._unwritten or not (force or time.monotonic() >= self._t_write):
+            return
+        df = pd.concat(self._unwritten, ignore_index=True) if len(self._unwritten) > 1 else self._unwritten[0]
+        self._unwritten, self._t_write = [], None
+        try:
+            with _PERSIST.time():
+                self.sink(df)
+        except Exception as e:
+            self._count("sink_errors")
+            self._set_error(self.stats["state"], e)
+        # Un ciclo del perfilador "ingest" va de una escritura al almacén a la siguiente.
+        metrics.PROFILER.boundary("ingest")
+
+
+class IngestService:
+    """
+    Conjunto de lectores seriales que comparten un ``RingBuffer``.
+
+    Pensado para vivir una sola vez por proceso (``st.cache_resource``): las
+    sesiones solo consultan ``read``/``tail``/``stats`` y nunca tocan el puerto.
+    Cada sesión se registra como ``owner`` de los puertos que usa; un puerto
+    se cierra cuando lo suelta la última (o con ``remove_port`` sin ``owner``).
+    """
+
+    def __init__(self, ring_capacity=50_000, sink=None, opener=None):
+        self.ring = RingBuffer(ring_capacity)
+        self.sink = sink
+        self.opener = opener
+        # Funciones ``fn(df, received_at)`` que reciben cada lote recién parseado.
+        self.listeners = []
+        self.hotspots = None
+        self._readers = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def add_port(self, port, baudrate=9600, sensor_id=DEFAULT_SENSOR_ID, owner=None, join_timeout=2.0, **kwargs):
+        """Inicia (o reutiliza) el lector de ``port``; si cambió el baudrate lo reinicia."""
+        with self._lock:
+            if owner is not None:
+                self._owners.setdefault(port, set()).add(owner)
+            reader = self._readers.get(port)
+            if reader is not None and reader.running and reader.baudrate == baudrate and reader.sensor_id == sensor_id:
+                return reader
+            if reader is not None:
+                # El lector viejo debe soltar el dispositivo antes de que el nuevo lo abra.
+                reader.stop()
+                reader.join(join_timeout)
+            kwargs.setdefault("opener", self.opener)
+            reader = SerialReader(port, self.ring, baudrate=baudrate, sensor_id=sensor_id, sink=self.sink, listeners=self.listeners, **kwargs)
+            reader.hotspots = self.hotspots
+            self._readers[port] = reader
+            reader.start()
+            return reader
+
+    def subscribe(self, listener):
+        """Agrega un listener ``fn(df, received_at)`` para todos los puertos."""
+        self.listeners.append(listener)
+
+    def set_hotspots(self, index):
+        """Fija el índice de focos FIRMS que usan todos los lectores al puntuar."""
+        self.hotspots = index
+        for reader in list(self._readers.values()):
+            reader.hotspots = index
+
+    def remove_port(self, port, owner=None, timeout=2.0):
+        """
+        Suelta ``port`` por parte de ``owner``; el lector se detiene solo si
+        ya nadie lo usa. Sin ``owner`` se detiene siempre. Devuelve True si se
+        detuvo.
+        """
+        with self._lock:
+            if owner is not None:
+                owners = self._owners.get(port, set())
+                owners.discard(owner)
+                if owners:
+                    return False
+            self._owners.pop(port, None)
+            reader = self._readers.pop(port, None)
+        if reader is not None:
+            reader.stop()
+            reader.join(timeout)
+        return reader is not None
+
+    def owners(self, port):
+        """Cuántas sesiones usan ``port``."""
+        return len(self._owners.get(port, ()))
+
+    def is_running(self, port):
+        reader = self._readers.get(port)
+        return reader is not None and reader.running
+
+    def ports(self):
+        return list(self._readers)
+
+    def reader(self, port):
+        return self._readers.get(port)
+
+    def read(self, since=0):
+        """Lecturas nuevas desde ``since`` como DataFrame, y la secuencia actual."""
+        seq, items = self.ring.read(since)
+        return seq, pd.DataFrame(items)
+
+    def tail(self, n=200, port=None):
+        """Últimas ``n`` lecturas (de todos los puertos o de uno)."""
+        if port is None:
+            return pd.DataFrame(self.ring.tail(n))
+        reader = self._readers.get(port)
+        if reader is None:
+            return pd.DataFrame()
+        return pd.DataFrame(list(reader.recent)[-n:])
+
+    def stats(self):
+        return {
+            "ports": [r.snapshot() for r in list(self._readers.values())],
+            "ring_size": len(self.ring),
+            "ring_capacity": self.ring.capacity,
+            "ring_overflow": self.ring.overflow,
+        }
+
+    def stop(self):
+        for port in list(self._readers):
+            self.remove_port(port)
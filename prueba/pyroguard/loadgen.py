@@ -0,0 +1,178 @@
+"""
+Generador de carga para el gateway: simula ``N`` nodos enviando uplinks.
+
+Cada nodo emite ``--rate`` lecturas por segundo con el protocolo habitual más
+``TX:<epoch>`` para que el gateway mida la latencia extremo a extremo. Por UDP
+las lecturas de un mismo tick se empaquetan en datagramas de hasta
+``--datagram`` líneas; por TCP se usa una conexión por cada ``--conns``.
+
+Contra un gateway ya corriendo::
+
+    python -m pyroguard.loadgen --udp 127.0.0.1:1700 --nodes 5000 --rate 1 --seconds 30
+
+Midiendo todo en un solo proceso (gateway embebido, almacén temporal y motor
+de alertas, que reporta la latencia lectura→alerta)::
+
+    python -m pyroguard.loadgen --embedded --nodes 5000 --rate 2 --seconds 20
+"""
+import asyncio
+import socket
+import time
+
+import numpy as np
+
+from .alerts import AlertEngine
+from .gateway import Gateway, format_alert_stats, format_stats, parse_address
+
+TICK = 0.01
+
+
+def node_lines(nodes, rng, tx):
+    """Una línea de protocolo por nodo (``nodes``: array de índices)."""
+    n = len(nodes)
+    t = rng.normal(30, 6, n)
+    h = rng.uniform(5, 80, n)
+    w = rng.uniform(0, 15, n)
+    sm = rng.uniform(0, 40, n)
+    dry = rng.uniform(0, 1, n)
+    return [f"ID:S-{nodes[i]:05d} T:{t[i]:.1f} H:{h[i]:.1f} W:{w[i]:.1f} SM:{sm[i]:.1f} DRY:{dry[i]:.2f} TX:{tx:.6f}" for i in range(n)]
+
+
+class LoadGenerator:
+    """
+    Reparte ``nodes`` nodos a ``rate`` lecturas/s cada uno en ticks de
+    ``TICK`` segundos; los nodos arrancan desfasados para no llegar en ráfaga.
+    """
+
+    def __init__(self, nodes=1000, rate=1.0, seed=0):
+        self.nodes = nodes
+        self.rate = rate
+        self.rng = np.random.default_rng(seed)
+        self.sent = 0
+        self._phase = self.rng.uniform(0, 1, nodes)
+
+    def due(self, t0, t1):
+        """Nodos con envío programado en ``[t0, t1)`` (segundos desde el inicio)."""
+        k0 = np.ceil(t0 * self.rate - self._phase)
+        k1 = np.ceil(t1 * self.rate - self._phase)
+        counts = np.maximum(k1 - k0, 0).astype(np.int64)
+        return np.repeat(np.arange(self.nodes), counts)
+
+    async def run_udp(self, addr, seconds, datagram=20):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        try:
+            await self._run(seconds, lambda lines: self._send_udp(sock, addr, lines, datagram))
+        finally:
+            sock.close()
+
+    def _send_udp(self, sock, addr, lines, datagram):
+        for i in range(0, len(lines), datagram):
+            try:
+                sock.sendto("\n".join(lines[i:i + datagram]).encode(), addr)
+            except BlockingIOError:
+                continue
+            self.sent += len(lines[i:i + datagram])
+
+    async def run_tcp(self, addr, seconds, conns=4):
+        streams = [await asyncio.open_connection(*addr) for _ in range(conns)]
+        writers = [w for _, w in streams]
+        turn = [0]
+
+        async def send(lines):
+            w = writers[turn[0] % len(writers)]
+            turn[0] += 1
+            w.write(("\n".join(lines) + "\n").encode())
+            # Si el gateway aplica contrapresión, aquí se espera.
+            await w.drain()
+            self.sent += len(lines)
+
+        try:
+            await self._run(seconds, send)
+        finally:
+            for w in writers:
+                w.close()
+
+    async def _run(self, seconds, send):
+        start = time.monotonic()
+        t_prev = 0.0
+        while t_prev < seconds:
+            await asyncio.sleep(TICK)
+            t_now = min(time.monotonic() - start, seconds)
+            nodes = self.due(t_prev, t_now)
+            t_prev = t_now
+            if len(nodes):
+                result = send(node_lines(nodes, self.rng, time.time()))
+                if asyncio.iscoroutine(result):
+                    await result
+        return time.monotonic() - start
+
+
+async def _embedded(args):
+    import tempfile
+
+    from .store import TelemetryStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TelemetryStore(tmp)
+        engine = AlertEngine()
+        gw = Gateway(store, queue_lines=args.queue, batch_lines=args.batch, batch_interval=args.interval,
+                     write_interval=args.write_interval, listeners=[engine.consume])
+        bound = await gw.start(udp=("127.0.0.1", 0), tcp=("127.0.0.1", 0))
+        gen = LoadGenerator(args.nodes, args.rate, args.seed)
+        t0 = time.monotonic()
+        if args.tcp_mode:
+            await gen.run_tcp(bound["tcp"], args.seconds, args.conns)
+        else:
+            await gen.run_udp(bound["udp"], args.seconds, args.datagram)
+        await gw.drain()
+        elapsed = time.monotonic() - t0
+        await gw.stop()
+        store.close()
+        s = gw.snapshot()
+        print(f"{gen.sent:,} lecturas enviadas en {elapsed:.1f} s ({gen.sent / elapsed:,.0f}/s objetivo {args.nodes * args.rate:,.0f}/s)")
+        print(format_stats(s))
+        print(format_alert_stats(engine.snapshot()))
+        engine.stop()
+
+
+async def _remote(args):
+    gen = LoadGenerator(args.nodes, args.rate, args.seed)
+    t0 = time.monotonic()
+    if args.tcp:
+        await gen.run_tcp(parse_address(args.tcp, "127.0.0.1"), args.seconds, args.conns)
+    else:
+        await gen.run_udp(parse_address(args.udp, "127.0.0.1"), args.seconds, args.datagram)
+    elapsed = time.monotonic() - t0
+    print(f"{gen.sent:,} lecturas enviadas en {elapsed:.1f} s ({gen.sent / elapsed:,.0f}/s)")
+
+
+def _main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Simula nodos que envían uplinks al gateway y mide lecturas/s y latencia.")
+    ap.add_argument("--nodes", type=int, default=1000)
+    ap.add_argument("--rate", type=float, default=1.0, help="lecturas/s por nodo")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--udp", help="host:puerto del gateway (UDP)")
+    ap.add_argument("--tcp", help="host:puerto del gateway (TCP)")
+    ap.add_argument("--datagram", type=int, default=20, help="líneas por datagrama UDP")
+    ap.add_argument("--conns", type=int, default=4, help="conexiones TCP")
+    ap.add_argument("--embedded", action="store_true", help="levanta un gateway local con almacén temporal")
+    ap.add_argument("--tcp-mode", action="store_true", help="con --embedded, enviar por TCP en lugar de UDP")
+    ap.add_argument("--queue", type=int, default=100_000)
+    ap.add_argument("--batch", type=int, default=5000)
+    ap.add_argument("--interval", type=float, default=0.05)
+    ap.add_argument("--write-interval", type=float, default=0.25)
+    args = ap.parse_args(argv)
+    if args.embedded:
+        asyncio.run(_embedded(args))
+    elif args.udp or args.tcp:
+        asyncio.run(_remote(args))
+    else:
+        ap.error("indica --udp, --tcp o --embedded")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,102 @@
+"""
+Preparación de datos para los mapas (pydeck / ``st.map``).
+
+Al navegador solo se envía lo que se dibuja: el historial se agrega por celdas
+de una rejilla cuyo tamaño depende del zoom, la capa de puntos recibe la
+última lectura de cada sensor y únicamente las columnas que usa el tooltip.
+"""
+import numpy as np
+import pandas as pd
+
+# Columnas que usa el tooltip de la capa de sensores.
+TOOLTIP_COLUMNS = ["sensor_id", "risk_label", "risk_score", "temp_c", "humidity_pct", "wind_ms", "latitude", "longitude"]
+
+# Tamaño de celda en pixeles de pantalla; con el zoom se traduce a grados.
+CELL_PX = 24
+
+# Máximo de puntos que se envían tal cual a ``st.map``.
+MAX_POINTS = 5000
+
+
+def cell_size_deg(zoom, cell_px=CELL_PX):
+    """Lado de la celda en grados para que mida ~``cell_px`` pixeles al ``zoom`` dado."""
+    return 360.0 / (256.0 * 2.0 ** float(zoom)) * cell_px
+
+
+def grid_aggregate(lat, lon, values=None, cell_deg=0.01):
+    """
+    Agrega puntos por celda cuadrada de ``cell_deg`` grados.
+
+    Devuelve un DataFrame con el centro de cada celda (``latitude``,
+    ``longitude``), ``count`` y, si se pasan ``values``, ``risk_mean`` y
+    ``risk_max`` (ignorando NaN).
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    iy = np.floor(lat[ok] / cell_deg).astype(np.int64)
+    ix = np.floor(lon[ok] / cell_deg).astype(np.int64)
+    data = {"iy": iy, "ix": ix}
+    if values is not None:
+        data["v"] = np.asarray(values, dtype=float)[ok]
+    g = pd.DataFrame(data).groupby(["iy", "ix"], sort=False)
+    if values is not None:
+        agg = g["v"].agg(["size", "mean", "max"]).rename(columns={"size": "count", "mean": "risk_mean", "max": "risk_max"})
+    else:
+        agg = g.size().to_frame("count")
+    agg = agg.reset_index()
+    agg.insert(0, "latitude", (agg.pop("iy") + 0.5) * cell_deg)
+    agg.insert(1, "longitude", (agg.pop("ix") + 0.5) * cell_deg)
+    return agg
+
+
+def latest_per_sensor(df, sensor_col="sensor_id", ts_col="timestamp"):
+    """Última lectura de cada sensor (por timestamp; empates: la última escrita)."""
+    if not len(df):
+        return df
+    if ts_col in df.columns:
+        df = df.sort_values(ts_col, kind="stable")
+    return df.drop_duplicates(subset=[sensor_col], keep="last")
+
+
+def tooltip_payload(df, columns=TOOLTIP_COLUMNS, decimals=3):
+    """Solo las columnas del tooltip, con flotantes redondeados para aligerar el JSON."""
+    out = df[[c for c in columns if c in df.columns]].copy()
+    for c in out.columns:
+        if out[c].dtype.kind == "f":
+            out[c] = out[c].round(decimals)
+    return out.reset_index(drop=True)
+
+
+def risk_map_payload(df, zoom):
+    """
+    Capas del mapa de riesgo para un DataFrame con ``latitude``/``longitude``/
+    ``risk_score``: ``(heat, points)``.
+
+    ``heat`` es la rejilla agregada (risk_mean/risk_max/count por celda) y
+    ``points`` la última lectura de cada sensor con las columnas del tooltip.
+    """
+    heat = grid_aggregate(df["latitude"], df["longitude"], df["risk_score"], cell_size_deg(zoom))
+    heat = heat[heat["risk_mean"].notna()].round({"risk_mean": 3, "risk_max": 3})
+    points = tooltip_payload(latest_per_sensor(df))
+    return heat.reset_index(drop=True), points
+
+
+def map_points(df, zoom=9, max_points=MAX_POINTS):
+    """
+    Puntos para ``st.map``: si hay pocos se envían tal cual (solo lat/lon); si
+    no, uno por celda con ``size`` (metros) proporcional al número de puntos.
+    """
+    pts = df[["latitude", "longitude"]]
+    if len(pts) <= max_points:
+        return pts.reset_index(drop=True)
+    cell = cell_size_deg(zoom)
+    # Se agranda la celda hasta que el número de celdas quepa en max_points.
+    while True:
+        agg = grid_aggregate(pts["latitude"], pts["longitude"], cell_deg=cell)
+        if len(agg) <= max_points:
+            break
+        cell *= 2
+    cell_m = cell * 111_320.0
+    agg["size"] = (cell_m / 2) * np.sqrt(agg["count"] / agg["count"].max())
+    return agg[["latitude", "longitude", "size"]]
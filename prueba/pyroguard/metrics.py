@@ -0,0 +1,326 @@
+"""
+Instrumentación del pipeline: contadores, histogramas de latencia por etapa y
+un perfilador por muestreo que se arma para un solo ciclo.
+
+Hay un registro por proceso (``REGISTRY``). Los módulos toman sus métricas
+una vez, al importarse, y en la ruta caliente solo pagan un par de
+``perf_counter`` y un ``bisect``::
+
+    _PARSE = stage("parse")
+    with _PARSE.time():
+        df = parse_telemetry_batch(lines)
+
+Todas las etapas comparten la familia ``pyroguard_stage_seconds`` con la
+etiqueta ``stage``. ``export(path)`` escribe formato de texto de Prometheus
+o, si la ruta termina en ``.json``, un snapshot JSON.
+"""
+import json
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from datetime import datetime
+
+# Límites (segundos) de los histogramas de latencia: de 50 µs a 10 s.
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_FAMILY = "pyroguard_stage_seconds"
+
+
+def _labels_text(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Histogram:
+    """Histograma de cubetas fijas; los percentiles se estiman por interpolación dentro de la cubeta."""
+
+    def __init__(self, name, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def quantile(self, q):
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return math.nan
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lo = self.buckets[i - 1] if i else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def summary(self):
+        with self._lock:
+            count, total = self.count, self.sum
+        out = {"count": count, "sum_s": total, "mean_ms": total / count * 1000 if count else None}
+        for p in (50, 95, 99):
+            out[f"p{p}_ms"] = self.quantile(p / 100) * 1000 if count else None
+        return out
+
+
+class Registry:
+    """Métricas por ``(nombre, etiquetas)``; ``counter``/``histogram`` devuelven la existente si ya se creó."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(name, key[1], **kwargs)
+                    if help:
+                        self._help.setdefault(name, help)
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name, help="", buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def stage(self, name):
+        return self.histogram(STAGE_FAMILY, "Duración de cada etapa del pipeline.", stage=name)
+
+    def metrics(self):
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda m: (m.name, m.labels))
+
+    def reset(self):
+        """Pone en cero todas las métricas (las referencias tomadas siguen siendo válidas)."""
+        for m in self.metrics():
+            with m._lock:
+                if isinstance(m, Counter):
+                    m.value = 0
+                else:
+                    m.counts = [0] * len(m.counts)
+                    m.sum, m.count = 0.0, 0
+
+    # --- exportación ---
+    def to_prometheus(self):
+        lines = []
+        typed = set()
+        for m in self.metrics():
+            if m.name not in typed:
+                typed.add(m.name)
+                if m.name in self._help:
+                    lines.append(f"# HELP {m.name} {self._help[m.name]}")
+                lines.append(f"# TYPE {m.name} {'counter' if isinstance(m, Counter) else 'histogram'}")
+            if isinstance(m, Counter):
+                lines.append(f"{m.name}{_labels_text(m.labels)} {m.value}")
+                continue
+            with m._lock:
+                counts, total, count = list(m.counts), m.sum, m.count
+            cumulative = 0
+            for le, c in zip(list(m.buckets) + ["+Inf"], counts):
+                cumulative += c
+                lines.append(f"{m.name}_bucket{_labels_text(m.labels, [('le', le)])} {cumulative}")
+            lines.append(f"{m.name}_sum{_labels_text(m.labels)} {total:.6f}")
+            lines.append(f"{m.name}_count{_labels_text(m.labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        counters, stages, histograms = {}, {}, {}
+        for m in self.metrics():
+            key = f"{m.name}{_labels_text(m.labels)}"
+            if isinstance(m, Counter):
+                counters[key] = m.value
+            elif m.name == STAGE_FAMILY:
+                stages[dict(m.labels)["stage"]] = m.summary()
+            else:
+                histograms[key] = m.summary()
+        return {"generated_at": datetime.now().isoformat(timespec="seconds"),
+                "counters": counters, "stages": stages, "histograms": histograms}
+
+    def export(self, path):
+        """Escribe el snapshot en ``path`` (JSON si termina en ``.json``, si no texto Prometheus)."""
+        if path.endswith(".json"):
+            text = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        else:
+            text = self.to_prometheus()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+        return path
+
+
+# --- perfilador ---
+class SamplingProfiler:
+    """
+    Perfilador por muestreo de un solo ciclo.
+
+    ``arm(stage)`` lo deja listo; el código instrumentado marca el ciclo con
+    ``begin(stage)``/``end(stage)`` (p. ej. una corrida del script del
+    dashboard) o, si el ciclo se repite, con ``boundary(stage)`` (p. ej. de
+    una escritura al almacén a la siguiente). Al empezar arranca un hilo que
+    toma la pila del hilo instrumentado cada ``interval`` segundos; al
+    terminar deja el reporte en ``reports[stage]``. Con ``all_threads`` se
+    muestrean todos los hilos del proceso (útil cuando el ciclo salta entre
+    hilos, como en el gateway). Sin armar, las marcas son solo una comparación.
+    """
+
+    def __init__(self, interval=0.001, max_seconds=30.0):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.armed = None
+        self.reports = {}
+        self._session = None
+        self._lock = threading.Lock()
+
+    def arm(self, stage):
+        self.armed = stage
+
+    def begin(self, stage, all_threads=False):
+        """Arranca el muestreo si ``stage`` está armada; devuelve True si arrancó."""
+        if self.armed != stage:
+            return False
+        with self._lock:
+            if self.armed != stage or self._session is not None:
+                return False
+            self.armed = None
+            self._session = self._start(stage, None if all_threads else threading.get_ident())
+        return True
+
+    def end(self, stage):
+        """Detiene el muestreo de ``stage`` si está en curso y guarda el reporte."""
+        session = self._session
+        if session is None or session["stage"] != stage:
+            return None
+        with self._lock:
+            if self._session is not session:
+                return None
+            self._session = None
+        return self._finish(session)
+
+    def boundary(self, stage, all_threads=False):
+        """Para ciclos que se repiten: cierra el ciclo perfilado o, si está armada, abre uno."""
+        if self.end(stage) is None:
+            self.begin(stage, all_threads)
+
+    def _start(self, stage, ident):
+        session = {"stage": stage, "ident": ident, "stop": threading.Event(), "samples": [], "t0": time.perf_counter()}
+        session["thread"] = threading.Thread(target=self._sample, args=(session,), name=f"profiler-{stage}", daemon=True)
+        session["thread"].start()
+        return session
+
+    def _sample(self, session):
+        ident, samples, stop = session["ident"], session["samples"], session["stop"]
+        own_ident = threading.get_ident()
+        deadline = time.perf_counter() + self.max_seconds
+        while not stop.wait(self.interval) and time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            if ident is not None:
+                frames = {ident: frames[ident]} if ident in frames else {}
+                if not frames:
+                    break
+            for thread_ident, frame in frames.items():
+                if thread_ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{_short_path(code.co_filename)}:{code.co_firstlineno} {code.co_name}")
+                    frame = frame.f_back
+                samples.append(stack)
+
+    def _finish(self, session):
+        session["stop"].set()
+        session["thread"].join()
+        samples = session["samples"]
+        own, cumulative = _Tally(), _Tally()
+        for stack in samples:
+            own[stack[0]] += 1
+            cumulative.update(set(stack))
+        report = self.reports[session["stage"]] = {
+            "stage": session["stage"],
+            "seconds": time.perf_counter() - session["t0"],
+            "samples": len(samples),
+            "own": own.most_common(),
+            "cumulative": cumulative.most_common(),
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        return report
+
+    @property
+    def running(self):
+        return self._session is not None
+
+
+def _short_path(path):
+    parts = path.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+def format_profile(report, n=15):
+    """Tabla de texto con las funciones de más muestras propias y acumuladas."""
+    total = max(report["samples"], 1)
+    lines = [f"ciclo '{report['stage']}': {report['seconds'] * 1000:.1f} ms, {report['samples']} muestras", "",
+             "   propio  acumulado  función"]
+    own, cumulative = dict(report["own"]), dict(report["cumulative"])
+    ranked = sorted(cumulative, key=lambda f: (-own.get(f, 0), -cumulative[f]))
+    for func in ranked[:n]:
+        lines.append(f"{own.get(func, 0) / total:8.1%} {cumulative[func] / total:10.1%}  {func}")
+    return "\n".join(lines)
+
+
+REGISTRY = Registry()
+PROFILER = SamplingProfiler()
+
+
+def counter(name, help="", **labels):
+    return REGISTRY.counter(name, help, **labels)
+
+
+def stage(name):
+    return REGISTRY.stage(name)
@@ -0,0 +1,152 @@
+"""
+Posición de los sensores: overrides manuales (overrides.json) y una posición
+determinística derivada del sensor_id para los que no tienen ninguna.
+"""
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .config import CENTER, OVR_PATH
+
+
+@lru_cache(maxsize=65536)
+def deterministic_latlon(sensor_id:str):
+    h = hashlib.md5(sensor_id.encode()).hexdigest()
+    j1 = int(h[0:2], 16) / 255.0
+    j2 = int(h[2:4], 16) / 255.0
+    lat = CENTER[0] + (j1 - 0.5) * 0.18
+    lon = CENTER[1] + (j2 - 0.5) * 0.18
+    return float(lat), float(lon)
+
+
+class OverrideCache:
+    """
+    Copia en memoria de overrides.json.
+
+    Solo se vuelve a leer el archivo cuando cambia su mtime/tamaño, así que
+    consultarla por cada lote (o por cada línea) cuesta un ``os.stat``.
+    """
+
+    def __init__(self, path=OVR_PATH):
+        self.path = path
+        self._stamp = None
+        self._data = {}
+        # Aumenta cada vez que el contenido se vuelve a leer.
+        self.generation = 0
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self):
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            data = {}
+            if stamp is not None:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            self._data, self._stamp = data, stamp
+            self.generation += 1
+        return self._data
+
+    def invalidate(self):
+        self._stamp = None
+
+
+OVERRIDES = OverrideCache()
+
+
+def load_overrides():
+    return dict(OVERRIDES.get())
+
+
+def save_overrides(d):
+    os.makedirs(os.path.dirname(OVERRIDES.path) or ".", exist_ok=True)
+    with open(OVERRIDES.path, "w", encoding="utf-8") as f:
+        json.dump(d, f, indent=2, ensure_ascii=False)
+    OVERRIDES.invalidate()
+
+
+def latlon_for(sensor_id, overrides=None):
+    """Posición de un sensor: override si existe, si no la determinística."""
+    ovr = OVERRIDES.get() if overrides is None else overrides
+    if sensor_id in ovr:
+        return float(ovr[sensor_id]["lat"]), float(ovr[sensor_id]["lon"])
+    return deterministic_latlon(sensor_id)
+
+
+class PositionTable:
+    """
+    Tabla sensor_id -> posición (override y determinística) para resolver
+    posiciones con un join en lugar de un ciclo por fila.
+
+    Se reconstruye solo cuando cambia ``OVERRIDES.generation`` (es decir,
+    después de ``save_overrides`` o de editar overrides.json a mano).
+    """
+
+    def __init__(self, overrides=OVERRIDES):
+        self.overrides = overrides
+        self._generation = None
+        self._table = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, sensor_ids):
+        """
+        Para una lista de sensor_id (sin repetir) devuelve arrays
+        ``(ovr_lat, ovr_lon, det_lat, det_lon)``; ``ovr_*`` es NaN si el sensor
+        no tiene override.
+        """
+        ovr = self.overrides.get()
+        with self._lock:
+            if self._generation != self.overrides.generation:
+                self._table = {}
+                self._generation = self.overrides.generation
+            table = self._table
+            out = np.empty((len(sensor_ids), 4))
+            for j, sid in enumerate(sensor_ids):
+                row = table.get(sid)
+                if row is None:
+                    d = ovr.get(sid)
+                    row = (float(d["lat"]), float(d["lon"])) if d is not None else (np.nan, np.nan)
+                    row = table[sid] = row + deterministic_latlon(sid)
+                out[j] = row
+        return out[:, 0], out[:, 1], out[:, 2], out[:, 3]
+
+
+POSITIONS = PositionTable()
+
+
+def resolve_positions(df, table=None):
+    """
+    Devuelve una copia de ``df`` con ``lat``/``lon`` resueltas:
+
+    - si el sensor tiene override, se usa el override;
+    - si no, se conserva la posición de la fila cuando lat y lon son válidas;
+    - en otro caso, la posición determinística del sensor_id.
+
+    El trabajo por sensor se hace una vez por sensor distinto; por fila solo
+    quedan operaciones vectorizadas.
+    """
+    table = POSITIONS if table is None else table
+    out = df.copy(deep=False)
+    if not len(df):
+        return out
+    codes, uniques = pd.factorize(df["sensor_id"], use_na_sentinel=False)
+    sids = [str(u) for u in uniques]
+    o_lat, o_lon, d_lat, d_lon = table.lookup(sids)
+    n = len(df)
+    lat = df["lat"].to_numpy(dtype=float, na_value=np.nan) if "lat" in df.columns else np.full(n, np.nan)
+    lon = df["lon"].to_numpy(dtype=float, na_value=np.nan) if "lon" in df.columns else np.full(n, np.nan)
+    has_ovr = ~np.isnan(o_lat)[codes]
+    missing = np.isnan(lat) | np.isnan(lon)
+    out["lat"] = np.where(has_ovr, o_lat[codes], np.where(missing, d_lat[codes], lat))
+    out["lon"] = np.where(has_ovr, o_lon[codes], np.where(missing, d_lon[codes], lon))
+    return out
@@ -0,0 +1,116 @@
+"""
+Motor de riesgo vectorizado.
+
+Evalúa el mismo modelo logístico que ``calc_risk_score`` pero sobre columnas
+completas (DataFrame, dict de arrays o matriz NumPy) en una sola pasada, y
+permite evaluar varios juegos de pesos contra los mismos datos a la vez.
+"""
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+# Variables del modelo y el peso que corresponde a cada una, en el mismo orden.
+# ``hotspot_proximity`` (0..1) la agrega ``spatial.HotspotIndex.annotate``; si
+# no hay focos FIRMS cargados la columna no existe y vale 0.
+FEATURES = ("temp_c", "humidity_pct", "wind_ms", "fuel_dryness", "smoke_ppm", "hotspot_proximity")
+COEF_FIELDS = ("w_temp", "w_hum", "w_wind", "w_dry", "w_smoke", "w_fire")
+
+# Bandas de etiqueta: score >= THRESHOLDS[i] sube a LABELS[i+1].
+THRESHOLDS = (0.33, 0.66)
+LABELS = ("Bajo", "Medio", "Alto")
+
+
+class RiskWeights(NamedTuple):
+    w_temp: float = 0.12
+    w_hum: float = -0.06
+    w_wind: float = 0.18
+    w_dry: float = 1.2
+    w_smoke: float = 0.22
+    bias: float = -3.0
+    w_fire: float = 2.0
+
+    @property
+    def coefs(self):
+        return np.array([getattr(self, f) for f in COEF_FIELDS], dtype=float)
+
+
+DEFAULT_WEIGHTS = RiskWeights()
+
+
+def feature_matrix(data):
+    """
+    Construye la matriz (n, len(FEATURES)) de entradas del modelo.
+
+    Igual que ``row.get(col, 0)``: una columna ausente vale 0 y un NaN presente
+    se conserva (y por tanto el score de esa fila será NaN). Una matriz NumPy
+    de 5 columnas (sin ``hotspot_proximity``) se acepta con proximidad 0.
+    """
+    if isinstance(data, np.ndarray):
+        X = np.asarray(data, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] == len(FEATURES) - 1:
+            X = np.hstack([X, np.zeros((len(X), 1))])
+        if X.shape[1] != len(FEATURES):
+            raise ValueError(f"Se esperaban {len(FEATURES)} columnas (o {len(FEATURES) - 1} sin focos), hay {X.shape[1]}")
+        return X
+
+    n = None
+    cols = []
+    for f in FEATURES:
+        if f in data:
+            col = np.atleast_1d(np.asarray(data[f], dtype=float))
+            n = len(col) if n is None else n
+            cols.append(col)
+        else:
+            cols.append(None)
+    if n is None:
+        n = len(data) if hasattr(data, "columns") else 1
+    X = np.zeros((n, len(FEATURES)), dtype=float)
+    for j, col in enumerate(cols):
+        if col is not None:
+            X[:, j] = col
+    return X
+
+
+def _sigmoid(z):
+    with np.errstate(over="ignore"):
+        return 1.0 / (1.0 + np.exp(-z))
+
+
+def score(data, weights=DEFAULT_WEIGHTS):
+    """Score de riesgo (0..1) por fila para un juego de pesos."""
+    weights = RiskWeights(*weights)
+    X = feature_matrix(data)
+    return _sigmoid(X @ weights.coefs + weights.bias)
+
+
+def score_many(data, weights_list):
+    """
+    Evalúa K juegos de pesos contra los mismos datos en una sola multiplicación.
+
+    Devuelve una matriz (K, n); útil para barridos de sensibilidad.
+    """
+    weights_list = [RiskWeights(*w) for w in weights_list]
+    C = np.array([w.coefs for w in weights_list], dtype=float).reshape(-1, len(FEATURES))
+    b = np.array([w.bias for w in weights_list], dtype=float)
+    X = feature_matrix(data)
+    return _sigmoid(C @ X.T + b[:, None])
+
+
+def labels(scores):
+    """Etiquetas Bajo/Medio/Alto para un array de scores (NaN -> Bajo)."""
+    s = np.asarray(scores, dtype=float)
+    with np.errstate(invalid="ignore"):
+        idx = (s >= THRESHOLDS[0]).astype(np.int8) + (s >= THRESHOLDS[1])
+    return np.asarray(LABELS, dtype=object)[idx]
+
+
+def calc_risk_score(row, w_temp=0.12, w_hum=-0.06, w_wind=0.18, w_dry=1.2, w_smoke=0.22, bias=-3.0, w_fire=2.0):
+    z = w_temp*row.get("temp_c",0) + w_hum*row.get("humidity_pct",0) + w_wind*row.get("wind_ms",0) + w_dry*row.get("fuel_dryness",0) + w_smoke*row.get("smoke_ppm",0) + w_fire*row.get("hotspot_proximity",0) + bias
+    return 1/(1+math.exp(-z))
+
+
+def label_from_score(s):
+    return LABELS[2] if s >= THRESHOLDS[1] else (LABELS[1] if s >= THRESHOLDS[0] else LABELS[0])
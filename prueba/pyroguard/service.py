@@ -0,0 +1,162 @@
+"""
+Servicio de datos compartido por todas las sesiones del dashboard.
+
+Vive una vez por proceso (``st.cache_resource``) y es dueño del almacén, de la
+ingesta serial y de la tabla de estado por sensor. Las sesiones no recalculan
+nada por su cuenta: piden ``scored(weights)`` y reciben una vista del snapshot
+vigente ya puntuado. El trabajo se hace una vez por versión de los datos y
+juego de pesos, sin importar cuántos navegadores estén abiertos.
+
+Las vistas son copias superficiales (comparten los arrays con la caché): se
+pueden filtrar, renombrar o agregarles columnas, pero no modificar en sitio.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics, risk
+from .alerts import AlertEngine, FileSink, UIQueueSink
+from .config import ALERTS_PATH
+from .ingest import IngestService
+from .positions import OVERRIDES, POSITIONS, resolve_positions
+from .state import SensorStateTable
+from .surface import RiskSurface
+
+_SYNC = metrics.stage("store_sync")
+_SNAPSHOT = metrics.stage("snapshot")
+_SCORE = metrics.stage("score")
+_SURFACE = metrics.stage("surface")
+
+
+class DataService:
+    """
+    Snapshot versionado de lecturas puntuadas.
+
+    La versión (``version``) combina la del estado por sensor, la generación
+    de los overrides de posición y la llave de los focos FIRMS vigentes; las
+    entradas de caché se indexan por versión y pesos del modelo.
+
+    - ``sync_interval``: segundos mínimos entre lecturas del almacén para
+      incorporar lo escrito por otros procesos (p. ej. el gateway).
+    - ``cache_size``: juegos de pesos puntuados que se conservan.
+    - ``alerts``: motor de alertas suscrito a la ingesta; por defecto escribe
+      a ``ALERTS_PATH`` y a ``alert_feed`` (la cola que lee la UI).
+    """
+
+    def __init__(self, store, state=None, ingest=None, positions=POSITIONS, sync_interval=2.0, cache_size=16, alerts=None):
+        self.store = store
+        self.state = state if state is not None else SensorStateTable()
+        self.ingest = ingest if ingest is not None else IngestService(sink=self._sink)
+        self.positions = positions
+        self.sync_interval = sync_interval
+        self.cache_size = cache_size
+        self.hotspots = None
+        self.hotspots_key = None
+        self.surface = RiskSurface()
+        self.alert_feed = UIQueueSink()
+        self.alerts = alerts if alerts is not None else AlertEngine([self.alert_feed, FileSink(ALERTS_PATH)])
+        self.ingest.subscribe(self.alerts.consume)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        self._base = (None, None)
+        self._scored = OrderedDict()
+        self.stats = {"syncs": 0, "base_builds": 0, "scored_builds": 0, "scored_hits": 0}
+        self.refresh(force=True)
+
+    def _sink(self, df):
+        self.store.append(df)
+        self.state.update_frame(df)
+
+    # --- versión y sincronización ---
+    def refresh(self, force=False):
+        """
+        Incorpora segmentos nuevos del almacén si pasó ``sync_interval``. Si
+        otra sesión ya está sincronizando, no espera.
+        """
+        if not force and time.monotonic() - self._last_sync < self.sync_interval:
+            return self.version
+        if self._sync_lock.acquire(blocking=force):
+            try:
+                with _SYNC.time():
+                    self.state.sync(self.store)
+                self._last_sync = time.monotonic()
+                self.stats["syncs"] += 1
+            finally:
+                self._sync_lock.release()
+        return self.version
+
+    @property
+    def version(self):
+        OVERRIDES.get()
+        return (self.state.version, OVERRIDES.generation, self.hotspots_key)
+
+    def set_hotspots(self, key, index):
+        """Fija los focos FIRMS vigentes para el riesgo y para la ingesta en vivo."""
+        with self._lock:
+            self.hotspots_key = key if index is not None else None
+            self.hotspots = index
+        self.ingest.set_hotspots(index)
+
+    # --- snapshot ---
+    def base(self):
+        """
+        Una fila por sensor con posición resuelta y, si hay focos cargados,
+        columnas de cercanía; más la matriz de entradas del modelo.
+        Devuelve ``(version, df, X)``; se reconstruye solo si cambió la versión.
+        """
+        with self._lock:
+            version = self.version
+            cached_version, cached = self._base
+            if cached_version == version:
+                return cached
+            with _SNAPSHOT.time():
+                df = self.state.snapshot()
+                if len(df):
+                    df = resolve_positions(df, self.positions)
+                    if self.hotspots is not None:
+                        df = self.hotspots.annotate(df)
+                X = risk.feature_matrix(df)
+            self._base = (version, (version, df, X))
+            self._scored.clear()
+            self.stats["base_builds"] += 1
+            return self._base[1]
+
+    def scored(self, weights=risk.DEFAULT_WEIGHTS):
+        """Vista del snapshot con ``risk_score``/``risk_label`` para ``weights``."""
+        weights = risk.RiskWeights(*weights)
+        version, df, X = self.base()
+        key = (version, weights)
+        with self._lock:
+            hit = self._scored.get(key)
+            if hit is not None:
+                self._scored.move_to_end(key)
+                self.stats["scored_hits"] += 1
+                return hit.copy(deep=False)
+        out = df.copy(deep=False)
+        if len(out):
+            with _SCORE.time():
+                scores = risk.score(X, weights)
+                out["risk_score"] = scores
+                out["risk_label"] = risk.labels(scores)
+        with self._lock:
+            self._scored[key] = out
+            self.stats["scored_builds"] += 1
+            while len(self._scored) > self.cache_size:
+                self._scored.popitem(last=False)
+        return out.copy(deep=False)
+
+    def surface_layers(self, weights=risk.DEFAULT_WEIGHTS, zoom=9):
+        """
+        Teselas PNG de la superficie de riesgo interpolada para ``weights`` y
+        ``zoom``; solo se recalculan las que tocan sensores que cambiaron.
+        """
+        version, df, _ = self.base()
+        with _SURFACE.time():
+            self.surface.update(df, version, self.hotspots, self.hotspots_key)
+            return self.surface.layers(weights, zoom)
+
+    def close(self):
+        self.ingest.stop()
+        self.alerts.stop()
+        self.store.close()
@@ -0,0 +1,128 @@
+"""
+Índice espacial de focos de calor (FIRMS) para cruzarlos con sensores.
+
+Los puntos se proyectan a vectores unitarios 3D y se indexan con un
+``scipy.spatial.cKDTree``. La distancia euclidiana entre vectores unitarios
+(cuerda) es monótona con la distancia sobre la esfera, así que los radios se
+convierten a cuerda para consultar y los resultados se devuelven como
+distancia de gran círculo exacta (haversine), sin los errores de tratar
+lat/lon como coordenadas planas.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Radio para contar focos "cercanos" y escala de la cercanía exp(-d/escala).
+HOTSPOT_RADIUS_KM = 10.0
+PROXIMITY_SCALE_KM = 5.0
+
+
+def to_unit_xyz(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distancia de gran círculo en km; admite broadcasting de NumPy."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def km_to_chord(km):
+    return 2.0 * np.sin(np.minimum(np.asarray(km, dtype=float), np.pi * EARTH_RADIUS_KM) / (2.0 * EARTH_RADIUS_KM))
+
+
+def chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=float) / 2.0, 0.0, 1.0))
+
+
+class HotspotIndex:
+    """
+    Índice de puntos (lat, lon) con consultas por radio y k vecinos más cercanos.
+
+    Construirlo cuesta O(n log n) y se hace una vez por carga de FIRMS; cada
+    consulta cuesta O(log n) por punto consultado.
+    """
+
+    def __init__(self, lat, lon):
+        from scipy.spatial import cKDTree
+
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        ok = ~(np.isnan(self.lat) | np.isnan(self.lon))
+        if not ok.all():
+            self.lat, self.lon = self.lat[ok], self.lon[ok]
+        self._tree = cKDTree(to_unit_xyz(self.lat, self.lon), balanced_tree=False) if len(self.lat) else None
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_frame(cls, df, lat_col="latitude", lon_col="longitude"):
+        return cls(df[lat_col].to_numpy(), df[lon_col].to_numpy())
+
+    def nearest(self, lat, lon, k=1):
+        """
+        Distancias (km) e índices de los ``k`` focos más cercanos a cada punto.
+
+        Con ``k=1`` devuelve arrays 1D; si no hay suficientes focos, las
+        posiciones faltantes tienen distancia ``inf`` e índice ``-1``.
+        """
+        xyz = to_unit_xyz(lat, lon)
+        n = len(xyz)
+        shape = (n,) if k == 1 else (n, k)
+        if self._tree is None or n == 0:
+            return np.full(shape, np.inf), np.full(shape, -1, dtype=np.intp)
+        chord, idx = self._tree.query(xyz, k=k)
+        idx = np.where(np.isinf(chord), -1, idx)
+        return np.where(np.isinf(chord), np.inf, chord_to_km(chord)), idx
+
+    def query_radius(self, lat, lon, radius_km):
+        """Para cada punto, array de índices de focos dentro de ``radius_km``."""
+        xyz = to_unit_xyz(lat, lon)
+        if self._tree is None:
+            return [np.zeros(0, dtype=np.intp) for _ in range(len(xyz))]
+        hits = self._tree.query_ball_point(xyz, float(km_to_chord(radius_km)))
+        return [np.asarray(h, dtype=np.intp) for h in hits]
+
+    def count_within(self, lat, lon, radius_km):
+        """Número de focos dentro de ``radius_km`` de cada punto."""
+        xyz = to_unit_xyz(lat, lon)
+        if self._tree is None or len(xyz) == 0:
+            return np.zeros(len(xyz), dtype=np.int64)
+        return np.asarray(self._tree.query_ball_point(xyz, float(km_to_chord(radius_km)), return_length=True), dtype=np.int64)
+
+    def annotate(self, df, radius_km=HOTSPOT_RADIUS_KM, lat_col="lat", lon_col="lon"):
+        """
+        Copia de ``df`` con ``hotspot_dist_km`` (foco más cercano),
+        ``hotspot_count`` (focos dentro de ``radius_km``) y ``hotspot_proximity``
+        (``exp(-dist/PROXIMITY_SCALE_KM)``, entrada del modelo de riesgo).
+
+        Las filas sin posición quedan con distancia ``inf`` y cercanía 0.
+        """
+        out = df.copy(deep=False)
+        cols = hotspot_columns(self, df[lat_col].to_numpy(dtype=float, na_value=np.nan), df[lon_col].to_numpy(dtype=float, na_value=np.nan), radius_km)
+        for name, values in cols.items():
+            out[name] = values
+        return out
+
+
+def hotspot_columns(index, lat, lon, radius_km=HOTSPOT_RADIUS_KM):
+    """Columnas de ``HotspotIndex.annotate`` para arrays de lat/lon."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    n = len(lat)
+    dist = np.full(n, np.inf)
+    count = np.zeros(n, dtype=np.int64)
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    if ok.any():
+        dist[ok], _ = index.nearest(lat[ok], lon[ok])
+        count[ok] = index.count_within(lat[ok], lon[ok], radius_km)
+    return {
+        "hotspot_dist_km": dist,
+        "hotspot_count": count,
+        "hotspot_proximity": np.exp(-dist / PROXIMITY_SCALE_KM),
+    }
@@ -0,0 +1,253 @@
+"""
+Estado incremental por sensor.
+
+``SensorStateTable`` guarda, por ``sensor_id``, la última lectura (con su
+riesgo) y agregados móviles de 5 min / 1 h / 24 h (media, máximo y pendiente)
+de temperatura, humedad y humo. Cada lectura nueva cuesta O(1) amortizado:
+las ventanas mantienen sumas corridas para media y pendiente, y una cola
+monótona para el máximo.
+
+Las ventanas terminan en la lectura más reciente de cada sensor, no en el
+reloj del servidor, así que un historial viejo también tiene agregados.
+"""
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .config import COLUMNS
+
+WINDOWS = {"5m": 300.0, "1h": 3600.0, "24h": 86400.0}
+TRACKED = ("temp_c", "humidity_pct", "smoke_ppm")
+
+
+def parse_ts(ts):
+    """Timestamp ISO -> segundos epoch (NaN si no se puede interpretar)."""
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    try:
+        return datetime.fromisoformat(str(ts)).timestamp()
+    except ValueError:
+        return math.nan
+
+
+class RollingWindow:
+    """
+    Ventana deslizante de ``span`` segundos sobre pares (t, x).
+
+    La pendiente es la de mínimos cuadrados de x contra t, en unidades por
+    minuto. Los tiempos se guardan relativos a ``t0`` para no perder precisión
+    con epochs grandes; cuando ``t`` se aleja mucho de ``t0`` las sumas se
+    recalculan desde los elementos de la ventana (costo amortizado O(1)).
+    """
+
+    __slots__ = ("span", "items", "maxq", "t0", "n", "st", "sx", "stt", "stx")
+
+    def __init__(self, span):
+        self.span = span
+        self.items = deque()
+        self.maxq = deque()
+        self.t0 = None
+        self._reset()
+
+    def _reset(self):
+        self.n = 0
+        self.st = self.sx = self.stt = self.stx = 0.0
+
+    def _add_sums(self, t, x, sign):
+        u = t - self.t0
+        self.n += sign
+        self.st += sign * u
+        self.sx += sign * x
+        self.stt += sign * u * u
+        self.stx += sign * u * x
+
+    def add(self, t, x):
+        if self.t0 is None or not self.items:
+            self.t0 = t
+            self._reset()
+        elif t - self.t0 > 4 * self.span:
+            self.t0 = self.items[0][0]
+            self._reset()
+            for ti, xi in self.items:
+                self._add_sums(ti, xi, 1)
+        self.items.append((t, x))
+        self._add_sums(t, x, 1)
+        while self.maxq and self.maxq[-1][1] <= x:
+            self.maxq.pop()
+        self.maxq.append((t, x))
+        self.evict(t)
+
+    def evict(self, now):
+        limit = now - self.span
+        items = self.items
+        while items and items[0][0] < limit:
+            t, x = items.popleft()
+            self._add_sums(t, x, -1)
+        while self.maxq and self.maxq[0][0] < limit:
+            self.maxq.popleft()
+        if not items:
+            self._reset()
+
+    def mean(self):
+        return self.sx / self.n if self.n else math.nan
+
+    def max(self):
+        return self.maxq[0][1] if self.maxq else math.nan
+
+    def slope(self):
+        if self.n < 2:
+            return math.nan
+        den = self.n * self.stt - self.st * self.st
+        if den <= 0:
+            return math.nan
+        return (self.n * self.stx - self.st * self.sx) / den * 60.0
+
+
+class _Sensor:
+    __slots__ = ("latest", "t", "windows")
+
+    def __init__(self, windows, tracked):
+        self.latest = None
+        self.t = -math.inf
+        self.windows = {(var, name): RollingWindow(span) for var in tracked for name, span in windows.items()}
+
+
+def _same_row(a, b):
+    """True si ``b`` no trae nada distinto de ``a`` (NaN cuenta como igual a NaN)."""
+    if a is None:
+        return False
+    for k, v in b.items():
+        w = a.get(k)
+        if v is w:
+            continue
+        eq = v == w
+        if isinstance(eq, (bool, np.bool_)) and eq:
+            continue
+        if isinstance(v, float) and isinstance(w, float) and math.isnan(v) and math.isnan(w):
+            continue
+        return False
+    return True
+
+
+class SensorStateTable:
+    """
+    Tabla incremental de estado por sensor.
+
+    - Lecturas más viejas que la última del sensor se ignoran (``late``).
+    - Una lectura con el mismo timestamp que la última la reemplaza (gana la
+      última escritura, igual que en el almacén) sin volver a sumarse a las
+      ventanas; así releer un lote ya visto no altera los agregados.
+    """
+
+    def __init__(self, windows=WINDOWS, tracked=TRACKED):
+        self.windows = dict(windows)
+        self.tracked = tuple(tracked)
+        self._sensors = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.late = 0
+        self.store_seen = {}
+        self._snapshot = (None, None)
+
+    def __len__(self):
+        return len(self._sensors)
+
+    def update(self, row):
+        """Agrega una lectura (dict con las columnas del almacén)."""
+        sid = row.get("sensor_id")
+        if sid is None or (isinstance(sid, float) and math.isnan(sid)):
+            return
+        sid = str(sid)
+        t = parse_ts(row.get("timestamp"))
+        if math.isnan(t):
+            t = time.time()
+        with self._lock:
+            s = self._sensors.get(sid)
+            if s is None:
+                s = self._sensors[sid] = _Sensor(self.windows, self.tracked)
+            if t < s.t:
+                self.late += 1
+                return
+            if t > s.t:
+                for (var, _), win in s.windows.items():
+                    x = row.get(var)
+                    if x is not None and not (isinstance(x, float) and math.isnan(x)):
+                        win.add(t, float(x))
+                s.t = t
+            elif _same_row(s.latest, row):
+                # Misma lectura releída (p. ej. desde el almacén): no invalida el snapshot.
+                return
+            s.latest = row
+            self.version += 1
+
+    def update_frame(self, df):
+        """Agrega todas las filas de un DataFrame, en orden."""
+        if df is None or not len(df):
+            return
+        cols = [c for c in df.columns if isinstance(c, str)]
+        for values in df[cols].itertuples(index=False, name=None):
+            self.update(dict(zip(cols, values)))
+
+    def sync(self, store):
+        """
+        Incorpora lo que otros procesos hayan escrito en ``store`` desde la
+        última sincronización. Lo ya visto se descarta por la regla de
+        timestamps, así que llamar de más es seguro.
+        """
+        df, self.store_seen = store.read_since(self.store_seen)
+        self.update_history(df)
+        return len(df)
+
+    def snapshot(self):
+        """
+        DataFrame con una fila por sensor: la última lectura (columnas del
+        almacén) y ``<var>_<ventana>_mean/max/slope``. Se reconstruye solo si
+        hubo lecturas nuevas.
+        """
+        with self._lock:
+            version, cached = self._snapshot
+            if version == self.version and cached is not None:
+                return cached.copy(deep=False)
+            rows = []
+            for sid, s in self._sensors.items():
+                if s.latest is None:
+                    continue
+                row = {c: s.latest.get(c) for c in COLUMNS}
+                row["sensor_id"] = sid
+                for (var, name), win in s.windows.items():
+                    row[f"{var}_{name}_mean"] = win.mean()
+                    row[f"{var}_{name}_max"] = win.max()
+                    row[f"{var}_{name}_slope"] = win.slope()
+                rows.append(row)
+            agg_cols = [f"{var}_{name}_{stat}" for var in self.tracked for name in self.windows for stat in ("mean", "max", "slope")]
+            snap = pd.DataFrame(rows, columns=COLUMNS + agg_cols)
+            for c in COLUMNS:
+                if c not in ("sensor_id", "timestamp", "risk_label"):
+                    snap[c] = pd.to_numeric(snap[c], errors="coerce").astype(float)
+            self._snapshot = (self.version, snap)
+            return snap.copy(deep=False)
+
+    def update_history(self, df):
+        """
+        Agrega un bloque de historial en orden de timestamp. De cada sensor solo
+        pasan las lecturas de la ventana más larga previa a su última lectura;
+        las anteriores no afectarían ningún agregado.
+        """
+        if df is None or not len(df):
+            return
+        df = df.sort_values("timestamp", kind="stable")
+        t = df["timestamp"].map(parse_ts).to_numpy(dtype=float)
+        last = pd.Series(t).groupby(df["sensor_id"].to_numpy()).transform("max").to_numpy()
+        keep = np.isnan(t) | np.isnan(last) | (t >= last - max(self.windows.values()))
+        self.update_frame(df[keep])
+
+    @classmethod
+    def from_history(cls, df, **kwargs):
+        table = cls(**kwargs)
+        table.update_history(df)
+        return table
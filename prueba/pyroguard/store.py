@@ -0,0 +1,308 @@
+"""
+Almacén de telemetría append-only en segmentos columnares (Parquet).
+
+Cada ``append`` escribe un segmento nuevo y pequeño dentro de la partición
+diaria que le corresponde (``date=YYYY-MM-DD``), así el costo de escribir no
+crece con el historial. Los segmentos se deduplican por (sensor_id, timestamp)
+al escribirse y una compactación en segundo plano fusiona los de una
+partición cuando se acumulan demasiados.
+
+Estructura en disco::
+
+    <root>/date=2025-10-05/part-00000001728141220123456789.parquet
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import metrics
+from .config import COLUMNS
+
+KEY = ["sensor_id", "timestamp"]
+
+SCHEMA = pa.schema([
+    ("sensor_id", pa.string()),
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("timestamp", pa.string()),
+    ("temp_c", pa.float64()),
+    ("humidity_pct", pa.float64()),
+    ("wind_ms", pa.float64()),
+    ("smoke_ppm", pa.float64()),
+    ("fuel_dryness", pa.float64()),
+    ("risk_score", pa.float64()),
+    ("risk_label", pa.string()),
+])
+
+UNKNOWN_PARTITION = "unknown"
+
+_APPEND = metrics.stage("store_append")
+_COMPACT = metrics.stage("store_compact")
+_ROWS = metrics.counter("pyroguard_rows_persisted_total", "Filas escritas al almacén.")
+_BYTES = metrics.counter("pyroguard_bytes_written_total", "Bytes de segmentos Parquet escritos.")
+_SEGMENTS = metrics.counter("pyroguard_segments_written_total", "Segmentos escritos por append.")
+
+
+def empty_frame():
+    return pd.DataFrame({c: pd.Series(dtype=("float64" if SCHEMA.field(c).type == pa.float64() else "object")) for c in COLUMNS})
+
+
+def _conform(df):
+    """Ajusta un DataFrame al esquema del almacén (columnas extra se descartan)."""
+    out = {}
+    n = len(df)
+    for field in SCHEMA:
+        if field.name in df.columns:
+            col = df[field.name]
+        else:
+            col = pd.Series([None] * n, index=df.index)
+        if field.type == pa.float64():
+            out[field.name] = pd.to_numeric(col, errors="coerce").astype("float64")
+        else:
+            out[field.name] = col.astype("string")
+    return pd.DataFrame(out, index=df.index)
+
+
+def _partition_keys(ts):
+    day = ts.str.slice(0, 10)
+    ok = day.str.match(r"^\d{4}-\d{2}-\d{2}$").fillna(False).astype(bool)
+    return day.where(ok, UNKNOWN_PARTITION)
+
+
+class TelemetryStore:
+    """
+    Almacén de lecturas particionado por día.
+
+    ``compact_threshold``: número de segmentos en una partición a partir del
+    cual se programa su compactación en segundo plano.
+    """
+
+    def __init__(self, root, compact_threshold=16, background=True):
+        self.root = root
+        self.compact_threshold = compact_threshold
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._last_seq = 0
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store-compact") if background else None
+
+    # --- escritura ---
+    def _next_seq(self):
+        seq = max(time.time_ns(), self._last_seq + 1)
+        self._last_seq = seq
+        return seq
+
+    def _segment_path(self, partition, seq):
+        return os.path.join(self.root, f"date={partition}", f"part-{seq:026d}.parquet")
+
+    def _write_table(self, table, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+        return os.path.getsize(path)
+
+    def append(self, df):
+        """
+        Agrega lecturas; devuelve el número de filas escritas.
+
+        Dentro del lote se conserva la última lectura de cada (sensor_id, timestamp).
+        """
+        if df is None or not len(df):
+            return 0
+        t0 = time.perf_counter()
+        data = _conform(df).drop_duplicates(subset=KEY, keep="last")
+        parts = _partition_keys(data["timestamp"].astype("string"))
+        written = 0
+        to_compact = []
+        with self._lock:
+            for partition, chunk in data.groupby(parts, sort=False):
+                table = pa.Table.from_pandas(chunk, schema=SCHEMA, preserve_index=False)
+                _BYTES.inc(self._write_table(table, self._segment_path(partition, self._next_seq())))
+                _SEGMENTS.inc()
+                written += len(chunk)
+                if len(self._segments(partition)) >= self.compact_threshold:
+                    to_compact.append(partition)
+        _ROWS.inc(written)
+        _APPEND.observe(time.perf_counter() - t0)
+        for partition in to_compact:
+            self._schedule_compaction(partition)
+        return written
+
+    def import_csv(self, path, chunksize=200_000):
+        """Importa un CSV con el formato de ``mock_sensors.csv``."""
+        total = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype={"sensor_id": str, "timestamp": str, "risk_label": str}):
+            total += self.append(chunk)
+        return total
+
+    # --- lectura ---
+    def partitions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d[len("date="):] for d in os.listdir(self.root) if d.startswith("date="))
+
+    def _segments(self, partition):
+        d = os.path.join(self.root, f"date={partition}")
+        if not os.path.isdir(d):
+            return []
+        return [os.path.join(d, f) for f in sorted(os.listdir(d)) if f.startswith("part-") and f.endswith(".parquet")]
+
+    def version(self):
+        """
+        Token que cambia cada vez que cambian los segmentos en disco.
+
+        Sirve como llave de caché (``st.cache_data``) para las lecturas.
+        """
+        newest, count = 0, 0
+        for partition in self.partitions():
+            for path in self._segments(partition):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                newest = max(newest, st.st_mtime_ns)
+                count += 1
+        return f"{count}-{newest}"
+
+    def _selected(self, start, end):
+        for partition in self.partitions():
+            if partition != UNKNOWN_PARTITION:
+                if start is not None and partition < str(start)[:10]:
+                    continue
+                if end is not None and partition > str(end)[:10]:
+                    continue
+            yield partition
+
+    def read(self, start=None, end=None, columns=None):
+        """
+        Devuelve las lecturas (ordenadas por escritura) entre ``start`` y ``end``
+        (timestamps ISO, inclusivos). Duplicados entre segmentos aún no
+        compactados se resuelven conservando la última escritura.
+        """
+        cols = list(columns) if columns is not None else list(COLUMNS)
+        read_cols = list(dict.fromkeys(cols + KEY))
+        with self._lock:
+            paths = [path for partition in self._selected(start, end) for path in self._segments(partition)]
+        df = self._read_paths(paths, read_cols)
+        if df is None:
+            return empty_frame()[cols]
+        if start is not None or end is not None:
+            ts = df["timestamp"].astype("string")
+            mask = np.ones(len(df), dtype=bool)
+            if start is not None:
+                mask &= (ts >= str(start)).fillna(False).to_numpy(dtype=bool)
+            if end is not None:
+                mask &= (ts <= str(end)).fillna(False).to_numpy(dtype=bool)
+            df = df[mask]
+        df = df.drop_duplicates(subset=KEY, keep="last").reset_index(drop=True)
+        return df[cols]
+
+    def _read_paths(self, paths, columns):
+        tables = []
+        for path in paths:
+            try:
+                tables.append(pq.read_table(path, columns=columns, schema=SCHEMA))
+            except FileNotFoundError:
+                # Compactado mientras tanto: su contenido ya está en el segmento fusionado.
+                continue
+        if not tables:
+            return None
+        return pa.concat_tables(tables).to_pandas()
+
+    @staticmethod
+    def _segment_seq(path):
+        return int(os.path.basename(path)[len("part-"):-len(".parquet")])
+
+    def read_since(self, seen=None, columns=None):
+        """
+        Lecturas de los segmentos que no están en ``seen`` o que cambiaron, y
+        el nuevo ``seen`` (ruta -> ``(mtime_ns, tamaño)`` de los vigentes).
+
+        Se compara contra los segmentos ya leídos y no contra una marca de
+        secuencia: con varios procesos escribiendo, un segmento de secuencia
+        menor puede terminar de escribirse después de otro de secuencia mayor.
+        Un segmento compactado cambia de contenido y se vuelve a leer, así que
+        puede devolver filas ya vistas; el llamador debe tolerar repetidos.
+        """
+        seen = seen or {}
+        cols = list(columns) if columns is not None else list(COLUMNS)
+        current = {}
+        with self._lock:
+            for part in self.partitions():
+                for p in self._segments(part):
+                    try:
+                        st = os.stat(p)
+                    except FileNotFoundError:
+                        continue
+                    current[p] = (st.st_mtime_ns, st.st_size)
+        paths = [p for p, sig in current.items() if seen.get(p) != sig]
+        if not paths:
+            return empty_frame()[cols], current
+        df = self._read_paths(sorted(paths, key=self._segment_seq), list(dict.fromkeys(cols + KEY)))
+        if df is None:
+            return empty_frame()[cols], current
+        df = df.drop_duplicates(subset=KEY, keep="last").reset_index(drop=True)
+        return df[cols], current
+
+    def __len__(self):
+        return len(self.read(columns=KEY))
+
+    # --- compactación ---
+    def _schedule_compaction(self, partition):
+        if self._executor is None:
+            self.compact(partition)
+            return
+        with self._lock:
+            if partition in self._pending:
+                return
+            self._pending.add(partition)
+        self._executor.submit(self._compact_pending, partition)
+
+    def _compact_pending(self, partition):
+        try:
+            self.compact(partition)
+        finally:
+            with self._lock:
+                self._pending.discard(partition)
+
+    def compact(self, partition=None):
+        """
+        Fusiona los segmentos de una partición (o de todas) en uno solo,
+        deduplicado por (sensor_id, timestamp).
+
+        El segmento fusionado reemplaza al más reciente de los originales, por
+        lo que conserva su lugar en el orden de escritura.
+        """
+        partitions = [partition] if partition is not None else self.partitions()
+        for p in partitions:
+            with self._compact_lock:
+                with self._lock:
+                    segments = self._segments(p)
+                if len(segments) < 2:
+                    continue
+                t0 = time.perf_counter()
+                # Los segmentos son inmutables: se leen y fusionan sin bloquear los append.
+                table = pa.concat_tables([pq.read_table(s, schema=SCHEMA) for s in segments])
+                df = table.to_pandas().drop_duplicates(subset=KEY, keep="last")
+                tmp = f"{segments[-1]}.{uuid.uuid4().hex[:8]}.tmp"
+                pq.write_table(pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False), tmp)
+                with self._lock:
+                    # Primero se reemplaza el último segmento y luego se borran los demás:
+                    # un lector concurrente puede ver duplicados (se resuelven al leer), nunca huecos.
+                    os.replace(tmp, segments[-1])
+                    for s in segments[:-1]:
+                        os.remove(s)
+                _COMPACT.observe(time.perf_counter() - t0)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
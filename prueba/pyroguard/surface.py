@@ -0,0 +1,316 @@
+"""
+Superficie de riesgo interpolada en teselas.
+
+Las entradas del modelo de cada sensor (temperatura, humedad, viento,
+sequedad y humo) se interpolan sobre una rejilla con Shepard modificado
+(IDW con peso que se anula en ``radius_km``) y cada celda pasa por el mismo
+modelo logístico que ``calc_risk_score``. La cercanía a focos FIRMS no se
+interpola: se calcula exacta en cada celda con ``spatial.HotspotIndex``.
+
+La rejilla sigue las teselas XYZ de Web Mercator (las del mapa base), con
+``cells`` × ``cells`` celdas por tesela. Se guardan dos niveles:
+
+- las entradas interpoladas de cada tesela, que solo se recalculan cuando
+  cambia un sensor a menos de ``radius_km`` de ella;
+- las imágenes PNG ya pintadas, en un LRU por (versión de datos, pesos,
+  zoom). Cambiar los pesos solo repite un producto matricial y el PNG.
+"""
+import base64
+import io
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import risk
+from .config import CENTER
+from .spatial import chord_to_km, hotspot_columns, km_to_chord, to_unit_xyz
+
+# Entradas que se interpolan (hotspot_proximity se calcula aparte).
+INTERPOLATED = tuple(f for f in risk.FEATURES if f != "hotspot_proximity")
+
+IDW_RADIUS_KM = 15.0
+IDW_POWER = 2.0
+IDW_NEIGHBORS = 8
+TILE_PX = 256
+TILE_CELLS = 64
+# Tamaño del lienzo del mapa en el dashboard: define cuántas teselas se ven.
+VIEW_PX = (1280, 720)
+
+# Rampa de color por score (0..1): verde -> ámbar -> rojo.
+COLOR_STOPS = np.array([0.0, risk.THRESHOLDS[0], risk.THRESHOLDS[1], 1.0])
+COLOR_RGB = np.array([[46, 204, 113], [255, 200, 0], [255, 120, 0], [220, 30, 30]], dtype=float)
+ALPHA = 150
+
+
+# --- teselas XYZ ---
+def lonlat_to_tile(lat, lon, zoom):
+    """Coordenadas fraccionarias de tesela (x, y) al ``zoom`` dado."""
+    n = 2.0 ** zoom
+    lat = np.clip(np.asarray(lat, dtype=float), -85.05112878, 85.05112878)
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(np.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+
+def tile_to_lonlat(x, y, zoom):
+    n = 2.0 ** zoom
+    lon = np.asarray(x, dtype=float) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1.0 - 2.0 * np.asarray(y, dtype=float) / n))))
+    return lat, lon
+
+
+def tile_bounds(zoom, x, y):
+    """``[oeste, sur, este, norte]`` de la tesela, en el formato de ``BitmapLayer``."""
+    north, west = tile_to_lonlat(x, y, zoom)
+    south, east = tile_to_lonlat(x + 1, y + 1, zoom)
+    return [float(west), float(south), float(east), float(north)]
+
+
+def view_tiles(zoom, center=CENTER, view_px=VIEW_PX):
+    """Teselas que cubren un lienzo de ``view_px`` pixeles centrado en ``center``."""
+    cx, cy = lonlat_to_tile(center[0], center[1], zoom)
+    hw, hh = view_px[0] / 2 / TILE_PX, view_px[1] / 2 / TILE_PX
+    n = 2 ** zoom
+    xs = range(max(0, int(math.floor(cx - hw))), min(n - 1, int(math.floor(cx + hw))) + 1)
+    ys = range(max(0, int(math.floor(cy - hh))), min(n - 1, int(math.floor(cy + hh))) + 1)
+    return [(x, y) for y in ys for x in xs]
+
+
+def cell_centers(zoom, x, y, cells=TILE_CELLS):
+    """lat/lon de los centros de celda de una tesela, fila 0 = borde norte."""
+    f = (np.arange(cells) + 0.5) / cells
+    lat, _ = tile_to_lonlat(x, y + f, zoom)
+    _, lon = tile_to_lonlat(x + f, y, zoom)
+    return np.repeat(lat, cells), np.tile(lon, cells)
+
+
+# --- interpolación ---
+def shepard_weights(dist_km, radius_km=IDW_RADIUS_KM, power=IDW_POWER):
+    """Peso IDW ``d^-p`` multiplicado por ``(1-(d/R)^2)^2``: continuo y nulo desde ``R``."""
+    d = np.maximum(dist_km, 0.05)
+    taper = np.clip(1.0 - (dist_km / radius_km) ** 2, 0.0, None) ** 2
+    with np.errstate(invalid="ignore"):
+        return np.where(np.isfinite(dist_km), taper / d ** power, 0.0)
+
+
+def interpolate(tree, values, lat, lon, radius_km=IDW_RADIUS_KM, k=IDW_NEIGHBORS, power=IDW_POWER):
+    """
+    Interpola ``values`` (n_sensores, m) en los puntos dados.
+
+    Cada columna usa solo los vecinos donde no es NaN; si ningún vecino
+    dentro de ``radius_km`` la tiene, vale 0 (igual que una clave ausente en
+    ``calc_risk_score``). Devuelve ``(valores (p, m), cubierto (p,))``;
+    ``cubierto`` es False donde no hay ningún sensor dentro del radio.
+    """
+    p, m = len(lat), values.shape[1]
+    if tree is None or p == 0:
+        return np.zeros((p, m)), np.zeros(p, dtype=bool)
+    k = min(k, tree.n)
+    chord, idx = tree.query(to_unit_xyz(lat, lon), k=k, distance_upper_bound=float(km_to_chord(radius_km)))
+    chord, idx = chord.reshape(p, k), idx.reshape(p, k)
+    found = np.isfinite(chord)
+    w = shepard_weights(np.where(found, chord_to_km(np.where(found, chord, 0.0)), np.inf), radius_km, power)
+    covered = (w > 0).any(axis=1)
+    vals = values[np.where(found, idx, 0)]               # (p, k, m)
+    ok = ~np.isnan(vals) & found[:, :, None]
+    wv = w[:, :, None] * ok
+    den = wv.sum(axis=1)
+    num = (wv * np.where(ok, vals, 0.0)).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(den > 0, num / den, 0.0)
+    return out, covered
+
+
+def colorize(scores, covered, cells=TILE_CELLS):
+    """Scores (celdas,) -> RGBA uint8 (cells, cells, 4); sin cobertura = transparente."""
+    s = np.nan_to_num(scores, nan=0.0)
+    rgb = np.stack([np.interp(s, COLOR_STOPS, COLOR_RGB[:, c]) for c in range(3)], axis=1)
+    alpha = np.where(covered & ~np.isnan(scores), ALPHA, 0)
+    return np.concatenate([rgb, alpha[:, None]], axis=1).astype(np.uint8).reshape(cells, cells, 4)
+
+
+def png_data_url(rgba):
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buf, format="PNG", optimize=False)
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode()
+
+
+class _Tile:
+    __slots__ = ("gen", "features", "covered")
+
+    def __init__(self, gen, features, covered):
+        self.gen = gen
+        self.features = features
+        self.covered = covered
+
+
+class RiskSurface:
+    """
+    Superficie de riesgo por teselas con recálculo incremental.
+
+    ``update(df, version)`` recibe la tabla por sensor (``lat``, ``lon`` y las
+    entradas del modelo) y detecta qué sensores cambiaron; ``layers(weights,
+    zoom)`` devuelve las teselas visibles como ``{"image", "bounds", "tile"}``.
+    """
+
+    def __init__(self, radius_km=IDW_RADIUS_KM, k=IDW_NEIGHBORS, power=IDW_POWER, cells=TILE_CELLS,
+                 cache_size=32, max_tiles=512, center=CENTER, view_px=VIEW_PX):
+        self.radius_km = radius_km
+        self.k = k
+        self.power = power
+        self.cells = cells
+        self.cache_size = cache_size
+        self.max_tiles = max_tiles
+        self.center = center
+        self.view_px = view_px
+        self.version = None
+        self.generation = 0
+        self._sensors = None
+        self._tree = None
+        self._values = None
+        self._hotspots = (None, None)
+        # Cambios pendientes: generación, lat y lon de cada sensor que cambió.
+        self._changes = (np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+        self._tiles = OrderedDict()
+        self._images = OrderedDict()
+        self._layers = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"tiles_built": 0, "images_built": 0, "layer_hits": 0}
+
+    # --- datos ---
+    def _frame(self, df):
+        cols = {"lat": df["lat"].to_numpy(dtype=float, na_value=np.nan), "lon": df["lon"].to_numpy(dtype=float, na_value=np.nan)}
+        for f in INTERPOLATED:
+            cols[f] = df[f].to_numpy(dtype=float, na_value=np.nan) if f in df.columns else np.full(len(df), np.nan)
+        out = pd.DataFrame(cols, index=pd.Index(df["sensor_id"].astype(str).to_numpy(), name="sensor_id"))
+        out = out[~(out["lat"].isna() | out["lon"].isna())]
+        return out[~out.index.duplicated(keep="last")]
+
+    def update(self, df, version, hotspots=None, hotspots_key=None):
+        """
+        Incorpora el estado por sensor de la versión ``version``. Solo marca
+        como sucias las teselas a menos de ``radius_km`` de un sensor que se
+        movió, cambió de valores, apareció o desapareció. Un cambio de focos
+        FIRMS invalida todas las teselas.
+        """
+        with self._lock:
+            if version == self.version:
+                return
+            new = self._frame(df)
+            old = self._sensors
+            if hotspots_key != self._hotspots[0]:
+                self._tiles.clear()
+            self._hotspots = (hotspots_key, hotspots)
+            if old is not None:
+                both = old.index.intersection(new.index)
+                a, b = old.loc[both].to_numpy(), new.loc[both].to_numpy()
+                same = ((a == b) | (np.isnan(a) & np.isnan(b))).all(axis=1)
+                moved = both[~same]
+                gone = old.index.difference(new.index)
+                added = new.index.difference(old.index)
+                lat = np.concatenate([old.loc[moved.union(gone), "lat"], new.loc[moved.union(added), "lat"]])
+                lon = np.concatenate([old.loc[moved.union(gone), "lon"], new.loc[moved.union(added), "lon"]])
+                if len(lat):
+                    self.generation += 1
+                    g, la, lo = self._changes
+                    self._changes = (np.concatenate([g, np.full(len(lat), self.generation)]),
+                                     np.concatenate([la, lat]), np.concatenate([lo, lon]))
+                    if len(self._changes[0]) > 50_000:
+                        # Demasiados cambios acumulados: más barato reconstruir todo.
+                        self._tiles.clear()
+                        self._changes = (np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+            else:
+                self.generation += 1
+                self._tiles.clear()
+            self._sensors = new
+            self._values = new[list(INTERPOLATED)].to_numpy()
+            if len(new):
+                from scipy.spatial import cKDTree
+
+                self._tree = cKDTree(to_unit_xyz(new["lat"].to_numpy(), new["lon"].to_numpy()))
+            else:
+                self._tree = None
+            self.version = version
+
+    def _dirty(self, tile, zoom, x, y):
+        g, lat, lon = self._changes
+        sel = g > tile.gen
+        if not sel.any():
+            return False
+        # Caja de la tesela ampliada por el radio de influencia.
+        west, south, east, north = tile_bounds(zoom, x, y)
+        dlat = self.radius_km / 111.32
+        dlon = dlat / max(math.cos(math.radians(max(abs(south), abs(north)))), 1e-6)
+        la, lo = lat[sel], lon[sel]
+        return bool(((la >= south - dlat) & (la <= north + dlat) & (lo >= west - dlon) & (lo <= east + dlon)).any())
+
+    def _tile(self, zoom, x, y):
+        key = (zoom, x, y)
+        tile = self._tiles.get(key)
+        if tile is not None and not self._dirty(tile, zoom, x, y):
+            self._tiles.move_to_end(key)
+            return tile
+        lat, lon = cell_centers(zoom, x, y, self.cells)
+        values, covered = interpolate(self._tree, self._values, lat, lon, self.radius_km, self.k, self.power)
+        # float32: una tesela de 64×64 celdas ocupa ~100 KB.
+        feats = np.zeros((len(lat), len(risk.FEATURES)), dtype=np.float32)
+        for j, f in enumerate(risk.FEATURES):
+            if f in INTERPOLATED:
+                feats[:, j] = values[:, INTERPOLATED.index(f)]
+        index = self._hotspots[1]
+        if index is not None and covered.any():
+            prox = hotspot_columns(index, lat, lon)["hotspot_proximity"]
+            feats[:, risk.FEATURES.index("hotspot_proximity")] = prox
+        tile = self._tiles[key] = _Tile(self.generation, feats, covered)
+        self.stats["tiles_built"] += 1
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def _has_sensors_near(self, zoom, x, y):
+        if self._tree is None:
+            return False
+        west, south, east, north = tile_bounds(zoom, x, y)
+        clat, clon = (south + north) / 2, (west + east) / 2
+        half_diag = math.hypot((north - south) / 2 * 111.32, (east - west) / 2 * 111.32 * math.cos(math.radians(clat)))
+        return bool(self._tree.query_ball_point(to_unit_xyz([clat], [clon])[0], float(km_to_chord(half_diag + self.radius_km)), return_length=True))
+
+    # --- render ---
+    def layers(self, weights=risk.DEFAULT_WEIGHTS, zoom=9):
+        """Teselas visibles alrededor de ``center`` como imágenes PNG (data URL)."""
+        weights = risk.RiskWeights(*weights)
+        zoom = int(zoom)
+        with self._lock:
+            key = (self.version, weights, zoom)
+            hit = self._layers.get(key)
+            if hit is not None:
+                self._layers.move_to_end(key)
+                self.stats["layer_hits"] += 1
+                return hit
+            out = []
+            for x, y in view_tiles(zoom, self.center, self.view_px):
+                if not self._has_sensors_near(zoom, x, y):
+                    continue
+                tile = self._tile(zoom, x, y)
+                if not tile.covered.any():
+                    continue
+                img_key = (zoom, x, y, tile.gen, self._hotspots[0], weights)
+                image = self._images.get(img_key)
+                if image is None:
+                    scores = risk.score(tile.features, weights)
+                    image = self._images[img_key] = png_data_url(colorize(scores, tile.covered, self.cells))
+                    self.stats["images_built"] += 1
+                    while len(self._images) > self.max_tiles:
+                        self._images.popitem(last=False)
+                else:
+                    self._images.move_to_end(img_key)
+                out.append({"image": image, "bounds": tile_bounds(zoom, x, y), "tile": f"{zoom}/{x}/{y}"})
+            self._layers[key] = out
+            while len(self._layers) > self.cache_size:
+                self._layers.popitem(last=False)
+            return out
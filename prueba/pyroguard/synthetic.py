@@ -0,0 +1,124 @@
+"""
+Datos sintéticos reproducibles para benchmarks y pruebas de carga.
+
+- ``sensor_frame``: N sensores × M lecturas con las columnas del almacén, con
+  huecos NaN como los de la fila de ejemplo (sin viento/humo/sequedad ni
+  riesgo) y algunas posiciones faltantes.
+- ``firms_frame`` / ``write_firms_csv``: focos con las columnas de un CSV de
+  VIIRS, concentrados alrededor de ``CENTER`` y dispersos por el resto.
+- ``overrides_for``: overrides de posición para una fracción de sensores.
+
+Todo depende solo de ``seed``.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from . import risk
+from .config import CENTER, COLUMNS
+
+# Columnas de un CSV de FIRMS VIIRS (375 m).
+FIRMS_COLUMNS = ["latitude", "longitude", "bright_ti4", "scan", "track", "acq_date", "acq_time",
+                 "satellite", "instrument", "confidence", "version", "bright_ti5", "frp", "daynight"]
+
+
+def sensor_ids(n):
+    """Identificadores con el formato de ``telemetry.synthetic_lines``."""
+    return np.array([f"S-{i:05d}" for i in range(n)], dtype=object)
+
+
+def sensor_frame(n_sensors=100, n_readings=100, start="2025-10-05T00:00:00", step_s=60, gap_frac=0.05, seed=0):
+    """
+    Historial de ``n_sensors`` sensores con ``n_readings`` lecturas cada uno,
+    intercaladas por timestamp como llegarían al almacén.
+
+    ``gap_frac`` es la fracción de valores faltantes por columna: viento,
+    humo, sequedad y riesgo quedan en NaN (como una lectura con solo ``T:`` y
+    ``H:``) y lat/lon en NaN para que se resuelvan por posición determinística.
+    """
+    rng = np.random.default_rng(seed)
+    n = n_sensors * n_readings
+    sid = np.tile(np.arange(n_sensors), n_readings)
+    step = np.repeat(np.arange(n_readings), n_sensors)
+
+    # Ciclo diario de temperatura/humedad más un sesgo por sensor.
+    t0 = datetime.fromisoformat(start)
+    secs = step * step_s
+    phase = 2 * np.pi * (secs % 86400) / 86400
+    bias = rng.normal(0, 3, n_sensors)[sid]
+    temp = 27 + 8 * np.sin(phase - np.pi / 2) + bias + rng.normal(0, 1, n)
+    hum = np.clip(45 - 20 * np.sin(phase - np.pi / 2) - bias + rng.normal(0, 4, n), 2, 100)
+    wind = np.abs(rng.normal(4, 2.5, n))
+    smoke = rng.gamma(2.0, 6.0, n)
+    dry = rng.beta(4, 3, n)
+
+    lat = CENTER[0] + rng.uniform(-0.5, 0.5, n_sensors)[sid]
+    lon = CENTER[1] + rng.uniform(-0.5, 0.5, n_sensors)[sid]
+    stamps = [(t0 + timedelta(seconds=int(s))).isoformat(timespec="seconds") for s in range(0, n_readings * step_s, step_s)]
+
+    df = pd.DataFrame({
+        "sensor_id": sensor_ids(n_sensors)[sid],
+        "lat": lat,
+        "lon": lon,
+        "timestamp": np.asarray(stamps, dtype=object)[step],
+        "temp_c": temp.round(1),
+        "humidity_pct": hum.round(1),
+        "wind_ms": wind.round(1),
+        "smoke_ppm": smoke.round(1),
+        "fuel_dryness": dry.round(2),
+    })
+    df["risk_score"] = risk.score(df)
+    df["risk_label"] = risk.labels(df["risk_score"].to_numpy())
+
+    if gap_frac > 0:
+        partial = rng.random(n) < gap_frac
+        df.loc[partial, ["wind_ms", "smoke_ppm", "fuel_dryness", "risk_score"]] = np.nan
+        df.loc[partial, "risk_label"] = risk.LABELS[0]
+        no_pos = rng.random(n) < gap_frac
+        df.loc[no_pos, ["lat", "lon"]] = np.nan
+    return df[COLUMNS]
+
+
+def firms_frame(n=10_000, near_frac=0.1, radius_deg=1.0, date="2025-10-05", seed=0):
+    """
+    ``n`` focos con columnas de VIIRS; ``near_frac`` de ellos dentro de
+    ``radius_deg`` de ``CENTER`` y el resto repartidos por el globo.
+    """
+    rng = np.random.default_rng(seed)
+    near = int(n * near_frac)
+    lat = np.concatenate([CENTER[0] + rng.uniform(-radius_deg, radius_deg, near),
+                          np.degrees(np.arcsin(rng.uniform(-1, 1, n - near)))])
+    lon = np.concatenate([CENTER[1] + rng.uniform(-radius_deg, radius_deg, near), rng.uniform(-180, 180, n - near)])
+    order = rng.permutation(n)
+    return pd.DataFrame({
+        "latitude": lat[order].round(5),
+        "longitude": lon[order].round(5),
+        "bright_ti4": rng.normal(335, 12, n).round(2),
+        "scan": rng.uniform(0.32, 0.8, n).round(2),
+        "track": rng.uniform(0.36, 0.78, n).round(2),
+        "acq_date": date,
+        "acq_time": rng.integers(0, 2400, n),
+        "satellite": "N",
+        "instrument": "VIIRS",
+        "confidence": rng.choice(["l", "n", "h"], n, p=[0.1, 0.8, 0.1]),
+        "version": "2.0NRT",
+        "bright_ti5": rng.normal(292, 8, n).round(2),
+        "frp": rng.gamma(1.5, 4.0, n).round(2),
+        "daynight": rng.choice(["D", "N"], n),
+    }, columns=FIRMS_COLUMNS)
+
+
+def write_firms_csv(path, n=10_000, **kwargs):
+    """Escribe un CSV de FIRMS sintético; devuelve la ruta."""
+    firms_frame(n, **kwargs).to_csv(path, index=False)
+    return path
+
+
+def overrides_for(n_sensors, frac=0.1, seed=0):
+    """Overrides (formato de overrides.json) para ``frac`` de los sensores."""
+    rng = np.random.default_rng(seed)
+    ids = sensor_ids(n_sensors)
+    picked = rng.choice(n_sensors, int(n_sensors * frac), replace=False)
+    return {str(ids[i]): {"lat": float(CENTER[0] + rng.uniform(-0.3, 0.3)), "lon": float(CENTER[1] + rng.uniform(-0.3, 0.3))}
+            for i in sorted(picked)}
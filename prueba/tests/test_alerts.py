@@ -0,0 +1,37 @@
+import time
+
+import pandas as pd
+import pytest
+
+from pyroguard.alerts import AlertEngine
+
+
+@pytest.fixture
+def engine():
+    e = AlertEngine(max_per_s=50.0, burst=10)
+    yield e
+    e.stop()
+
+
+def batch(ids, score, ts):
+    return pd.DataFrame({"sensor_id": ids, "risk_score": score, "timestamp": ts})
+
+
+def test_rate_limited_alerts_are_retried_not_lost(engine):
+    ids = [f"S{i}" for i in range(30)]
+    assert len(engine.consume(batch(ids, 0.9, "2026-10-17T10:00:00"))) == 10
+    assert engine.stats["suppressed_rate"] == 20
+    assert len(engine.active()) == 10
+    sent = 10
+    deadline = time.monotonic() + 5
+    while sent < 30 and time.monotonic() < deadline:
+        time.sleep(0.2)
+        sent += len(engine.consume(batch(ids, 0.9, "2026-10-17T10:00:01")))
+    assert sent == 30 and len(engine.active()) == 30
+
+
+def test_active_excludes_sensors_lowered_below_min_level(engine):
+    engine.consume(batch(["a", "b"], 0.9, "2026-10-17T10:00:00"))
+    out = engine.consume(batch(["a"], 0.5, "2026-10-17T10:00:01"))
+    assert [(x["sensor_id"], x["kind"]) for x in out] == [("a", "cleared")]
+    assert engine.active() == {"b": "Crítico"}
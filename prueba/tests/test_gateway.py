@@ -0,0 +1,60 @@
+import asyncio
+import socket
+import time
+
+from pyroguard.gateway import Gateway
+from pyroguard.state import parse_ts
+from pyroguard.store import TelemetryStore
+
+
+def run_gateway(tmp_path, send):
+    async def main():
+        store = TelemetryStore(str(tmp_path))
+        gw = Gateway(store, batch_interval=0.02, write_interval=0.05)
+        bound = await gw.start(udp=("127.0.0.1", 0), tcp=("127.0.0.1", 0))
+        await send(bound)
+        await asyncio.sleep(0.1)
+        assert await gw.drain()
+        await gw.stop()
+        store.close()
+        return gw, store.read()
+    return asyncio.run(main())
+
+
+def test_tcp_readings_in_the_same_second_are_not_collapsed(tmp_path):
+    async def send(bound):
+        _, writer = await asyncio.open_connection(*bound["tcp"])
+        for i in range(5):
+            writer.write(f"ID:A T:{30 + i}\n".encode())
+            await writer.drain()
+            await asyncio.sleep(0.01)
+        writer.close()
+        await writer.wait_closed()
+
+    gw, df = run_gateway(tmp_path, send)
+    assert len(df) == 5 and df["timestamp"].nunique() == 5
+    assert gw.stats["rows_written"] == 5
+
+
+def test_udp_lines_of_one_datagram_get_distinct_stamps(tmp_path):
+    async def send(bound):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.sendto(b"ID:A T:30\nID:A T:31\nID:A T:32\n", bound["udp"])
+
+    _, df = run_gateway(tmp_path, send)
+    assert df["temp_c"].tolist() == [30.0, 31.0, 32.0]
+
+
+def test_tx_epoch_is_the_timestamp_and_rows_written_counts_after_dedupe(tmp_path):
+    async def send(bound):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.sendto(b"ID:A T:30 TX:1760000000.25\nID:A T:31 TX:1760000000.25\nID:B T:30 TX:5\n", bound["udp"])
+
+    gw, df = run_gateway(tmp_path, send)
+    assert gw.stats["lines_parsed"] == 3
+    assert gw.stats["rows_written"] == 2
+    a = df[df["sensor_id"] == "A"]
+    assert a["temp_c"].tolist() == [31.0]
+    assert a["timestamp"].iloc[0].endswith(":20.250")
+    # TX fuera de rango: se usa la hora de llegada.
+    assert abs(parse_ts(df[df["sensor_id"] == "B"]["timestamp"].iloc[0]) - time.time()) < 30
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from pyroguard.ingest import IngestService, RingBuffer, SerialReader, open_serial
+from pyroguard.state import parse_ts
+
+pytest.importorskip("serial")
+
+
+def wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def loop_opener(payload):
+    """Abre ``loop://`` con ``open_serial`` y escribe ``payload``: el lector lo lee de vuelta."""
+    def opener(port, baudrate):
+        ser = open_serial(port, baudrate)
+        ser.write(payload)
+        return ser
+    return opener
+
+
+def test_serial_reader_over_loop_device():
+    lines = [f"ID:S-{i % 2} T:{20 + i} H:40 W:3 SM:10 DRY:0.5" for i in range(20)] + ["basura sin temperatura"]
+    written = []
+    ring = RingBuffer(100)
+    # ``loop://`` simula el tiempo de transmisión: a 9600 baud la escritura excedería su timeout.
+    reader = SerialReader("loop://", ring, baudrate=115200, opener=loop_opener(("\n".join(lines) + "\n").encode()),
+                          sink=written.append, write_interval=0.05)
+    reader.start()
+    try:
+        assert wait_for(lambda: reader.stats["lines_read"] >= 21)
+    finally:
+        reader.stop()
+        reader.join(2.0)
+    assert reader.stats["lines_parsed"] == 20
+    assert reader.stats["lines_rejected"] == 1
+    seq, items = ring.read(0)
+    assert seq == 20 and [r["temp_c"] for r in items] == [20.0 + i for i in range(20)]
+    assert sum(len(df) for df in written) == 20
+    assert reader.snapshot()["state"] == "detenido"
+
+
+def test_serial_lines_get_their_own_arrival_time():
+    """Varias lecturas del mismo sensor en un lote de 50 ms no comparten timestamp."""
+    ring = RingBuffer(100)
+
+    class Slow:
+        def __init__(self):
+            self.n = 0
+
+        def readline(self):
+            time.sleep(0.005)
+            self.n += 1
+            return b"T:30 H:40\n" if self.n <= 10 else b""
+
+        def close(self):
+            pass
+
+    reader = SerialReader("fake", ring, opener=lambda p, b: Slow(), batch_interval=0.2)
+    reader.start()
+    try:
+        assert wait_for(lambda: reader.stats["lines_parsed"] >= 10)
+    finally:
+        reader.stop()
+        reader.join(2.0)
+    stamps = [r["timestamp"] for r in ring.tail(10)]
+    assert len(set(stamps)) == 10
+    assert stamps == sorted(stamps, key=parse_ts)
+
+
+def test_ring_buffer_overflow_counts_only_missed_readings():
+    ring = RingBuffer(3)
+    ring.push(range(5))
+    assert ring.overflow == 0
+    seq, items = ring.read(1)
+    assert (seq, items, ring.overflow) == (5, [2, 3, 4], 1)
+
+
+def test_shared_port_stops_with_last_owner_and_replacement_joins_old_reader():
+    open_now = []
+    overlap = threading.Event()
+
+    class Fake:
+        def __init__(self):
+            if open_now:
+                overlap.set()
+            open_now.append(self)
+
+        def readline(self):
+            time.sleep(0.02)
+            return b"T:30\n"
+
+        def close(self):
+            open_now.remove(self)
+
+    svc = IngestService(opener=lambda p, b: Fake())
+    svc.add_port("x", 9600, owner="a")
+    svc.add_port("x", 9600, owner="b")
+    assert wait_for(lambda: open_now)
+    svc.add_port("x", 19200, owner="a")
+    assert wait_for(lambda: svc.reader("x").snapshot()["state"] == "conectado")
+    assert not overlap.is_set()
+    assert svc.remove_port("x", owner="a") is False and svc.is_running("x")
+    assert svc.remove_port("x", owner="b") is True and not svc.is_running("x")
@@ -0,0 +1,46 @@
+import pandas as pd
+import pyarrow as pa
+
+from pyroguard.state import SensorStateTable
+from pyroguard.store import SCHEMA, TelemetryStore, _conform
+
+
+def frame(*rows):
+    return pd.DataFrame([{"sensor_id": s, "timestamp": ts, "temp_c": t, "risk_score": 0.3, "lat": 1.0, "lon": 2.0}
+                         for s, ts, t in rows])
+
+
+def test_append_dedupes_and_reports_rows_written(tmp_path):
+    store = TelemetryStore(str(tmp_path), background=False)
+    df = frame(("a", "2025-10-05T10:00:00.000", 30), ("a", "2025-10-05T10:00:00.000", 31),
+               ("a", "2025-10-05T10:00:00.200", 32))
+    assert store.append(df) == 2
+    assert store.read()["temp_c"].tolist() == [31.0, 32.0]
+
+
+def test_read_since_picks_up_a_lower_sequence_segment_written_late(tmp_path):
+    store = TelemetryStore(str(tmp_path), background=False)
+    store.append(frame(("a", "2025-10-05T10:00:00", 30)))
+    df, seen = store.read_since()
+    assert df["sensor_id"].tolist() == ["a"]
+    # Otro proceso termina de escribir un segmento de secuencia menor.
+    table = pa.Table.from_pandas(_conform(frame(("b", "2025-10-05T10:00:01", 30))), schema=SCHEMA, preserve_index=False)
+    store._write_table(table, store._segment_path("2025-10-05", 1))
+    df, seen = store.read_since(seen)
+    assert df["sensor_id"].tolist() == ["b"]
+    df, seen = store.read_since(seen)
+    assert df.empty
+
+
+def test_reread_identical_row_does_not_bump_version(tmp_path):
+    store = TelemetryStore(str(tmp_path), background=False)
+    store.append(frame(("a", "2025-10-05T10:00:00", 30)))
+    table = SensorStateTable()
+    table.sync(store)
+    version = table.version
+    table.store_seen = {}
+    table.sync(store)
+    assert table.version == version
+    table.update({"sensor_id": "a", "timestamp": "2025-10-05T10:00:00", "temp_c": 35.0})
+    assert table.version == version + 1
+    assert table.snapshot().loc[0, "temp_c"] == 35.0